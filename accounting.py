@@ -0,0 +1,126 @@
+import os
+import re
+import time
+import asyncio
+import logging
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from pymongo import ASCENDING, DESCENDING
+
+import config
+from verify import db
+
+LOG = logging.getLogger(__name__)
+
+# -----------------------
+# 📈 Per-task resource accounting
+# -----------------------
+task_stats = db["task_stats"]
+task_stats.create_index([("user_id", ASCENDING), ("ended_at", DESCENDING)])
+task_stats.create_index([("host", ASCENDING), ("ended_at", DESCENDING)])
+
+# -benchmark makes ffmpeg print its own rusage on exit, so short children and
+# the last seconds of long ones are counted too
+BENCH_RE = re.compile(r"bench: utime=([\d.]+)s stime=([\d.]+)s")
+
+
+def ffmpeg_cpu(stderr: str) -> float:
+    """CPU seconds reported by `-benchmark` in an ffmpeg log (0 if it was killed before printing)."""
+    return sum(float(user) + float(system) for user, system in BENCH_RE.findall(stderr))
+
+
+class TaskStats:
+    def __init__(self, task_id: int, user_id: int, username: str, url: str, profile: str, seconds: int):
+        self.doc = {
+            "_id": task_id,
+            "user_id": user_id,
+            "username": username,
+            "host": (urlsplit(url).hostname or "").lower(),
+            "url": url,
+            "profile": profile,
+            "requested_seconds": seconds,
+            "started_at": time.time(),
+            "stages": {},
+        }
+        self.cpu_seconds = 0.0
+        self.peak_bytes = 0
+        # Bytes pulled from the source: HTTP segment fetches (VOD) or ffmpeg's
+        # -progress total_size (live), never a local re-read of the same data
+        self.ingest_bytes = 0
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            stages = self.doc["stages"]
+            stages[name] = round(stages.get(name, 0) + time.monotonic() - started, 3)
+
+    def add_ffmpeg(self, stderr: str, ingest_bytes: int = 0):
+        """Charge one finished ffmpeg run."""
+        self.cpu_seconds += ffmpeg_cpu(stderr)
+        self.ingest_bytes += ingest_bytes
+
+    def observe_file(self, path: str):
+        try:
+            self.peak_bytes = max(self.peak_bytes, os.path.getsize(path))
+        except OSError:
+            pass
+
+    async def watch(self, path: str):
+        """Sample the output size until cancelled."""
+        while True:
+            self.observe_file(path)
+            await asyncio.sleep(config.ACCOUNTING_SAMPLE_SECONDS)
+
+    def save(self, status: str, output_path: str = None):
+        if output_path:
+            self.observe_file(output_path)
+        self.doc.update({
+            "status": status,
+            "ended_at": time.time(),
+            "cpu_seconds": round(self.cpu_seconds, 2),
+            "ingest_bytes": self.ingest_bytes,
+            "peak_bytes": self.peak_bytes,
+        })
+        self.doc["wall_seconds"] = round(self.doc["ended_at"] - self.doc["started_at"], 2)
+        try:
+            task_stats.replace_one({"_id": self.doc["_id"]}, self.doc, upsert=True)
+        except Exception as e:
+            LOG.warning(f"[Accounting] Failed to save stats for {self.doc['_id']}: {e}")
+
+
+def aggregate(group_by: str, since: float, limit: int = 10):
+    return list(task_stats.aggregate([
+        {"$match": {"ended_at": {"$gte": since}}},
+        {"$group": {
+            "_id": f"${group_by}",
+            "tasks": {"$sum": 1},
+            "cpu_seconds": {"$sum": "$cpu_seconds"},
+            "ingest_bytes": {"$sum": "$ingest_bytes"},
+            "peak_bytes": {"$max": "$peak_bytes"},
+            "wall_seconds": {"$sum": "$wall_seconds"},
+            "username": {"$last": "$username"},
+        }},
+        {"$sort": {"cpu_seconds": DESCENDING}},
+        {"$limit": limit},
+    ]))
+
+
+_usage_cache = {}
+
+
+def cpu_used_today(user_id: int) -> float:
+    """CPU seconds the user's tasks consumed in the last 24h (cached for a minute)."""
+    cached = _usage_cache.get(user_id)
+    if cached and cached[0] > time.time() - 60:
+        return cached[1]
+    rows = list(task_stats.aggregate([
+        {"$match": {"user_id": user_id, "ended_at": {"$gte": time.time() - 86400}}},
+        {"$group": {"_id": None, "cpu": {"$sum": "$cpu_seconds"}}},
+    ]))
+    used = rows[0]["cpu"] if rows else 0.0
+    _usage_cache[user_id] = (time.time(), used)
+    return used
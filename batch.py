@@ -0,0 +1,85 @@
+import re
+
+from outbound import message_key
+
+TIMESTAMP_RE = re.compile(r"^\d{2}:\d{2}:\d{2}(-\d{2}:\d{2}:\d{2})?$")
+NAME_WIDTH = 40
+
+
+def split_lines(text: str, default_timestamp: str = None):
+    """Turn a batch message or .txt/.m3u file into `url timestamp name` lines.
+
+    Plain lines use the normal request syntax. In .m3u files the #EXTINF title
+    becomes the name and the duration comes from `default_timestamp` (the
+    document caption) unless the URL line carries its own.
+    """
+    lines = []
+    title = None
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if line.startswith("#EXTINF"):
+            title = line.split(",", 1)[1].strip() if "," in line else None
+            continue
+        if line.startswith("#"):
+            continue
+
+        parts = line.split(" ", 2)
+        if len(parts) == 1 and default_timestamp:
+            line = f"{parts[0]} {default_timestamp} {title or ''}".strip()
+        elif len(parts) > 1 and not TIMESTAMP_RE.match(parts[1]) and default_timestamp:
+            line = f"{parts[0]} {default_timestamp} {line.split(' ', 1)[1]}"
+        lines.append(line)
+        title = None
+    return lines
+
+
+class Batch:
+    """One aggregated status message for every job of a batch."""
+
+    def __init__(self, outbound, msg, names):
+        self.outbound = outbound
+        self.msg = msg
+        self.key = message_key(msg)
+        self.names = [n if len(n) <= NAME_WIDTH else n[:NAME_WIDTH - 1] + "…" for n in names]
+        self.lines = ["⏳ queued"] * len(names)
+        self.finished = 0
+        self.failed = 0
+
+    def set(self, index: int, text: str):
+        self.lines[index] = text
+        self.render()
+
+    def render(self):
+        total = len(self.lines)
+        header = f"📦 **Batch**: {self.finished}/{total} done"
+        if self.failed:
+            header += f", {self.failed} failed"
+        body = "\n".join(f"{i + 1}. {name} — {line}" for i, (name, line) in enumerate(zip(self.names, self.lines)))
+        self.outbound.edit(self.msg, f"{header}\n\n{body}"[:4096])
+
+    def item(self, index: int):
+        return BatchItemStatus(self, index)
+
+
+class BatchItemStatus:
+    """MessageStatus look-alike that reports into one line of a Batch."""
+
+    def __init__(self, batch: Batch, index: int):
+        self.batch = batch
+        self.index = index
+        self.key = (batch.key, index)
+
+    def edit(self, text: str):
+        # Progress texts are multi-line; the first line is enough in a summary
+        self.batch.set(self.index, f"🔄 {text.splitlines()[0]}")
+
+    async def done(self):
+        self.batch.finished += 1
+        self.batch.set(self.index, "✅ sent")
+
+    async def fail(self, text: str):
+        self.batch.finished += 1
+        self.batch.failed += 1
+        self.batch.set(self.index, f"❌ {text.splitlines()[0].lstrip('❌ ')}")
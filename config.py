@@ -45,3 +45,80 @@ LIMIT_LINK = int(environ.get("LIMIT_LINK", "20"))
 
 # 👤 Max number of simultaneous recordings per individual user (0 = unlimited)
 USER_LIMIT_LINK = int(environ.get("USER_LIMIT_LINK", "3"))
+
+# 📤 Outbound request pacing (Telegram allows ~1 msg/s per chat, 20/min per group, ~30/s overall)
+OUTBOUND_GLOBAL_RATE = float(environ.get("OUTBOUND_GLOBAL_RATE", "25"))  # requests per second, 0 = unlimited
+OUTBOUND_PRIVATE_INTERVAL = float(environ.get("OUTBOUND_PRIVATE_INTERVAL", "1"))  # seconds between requests to one private chat
+OUTBOUND_GROUP_INTERVAL = float(environ.get("OUTBOUND_GROUP_INTERVAL", "3"))  # seconds between requests to one group/channel
+
+# 📰 Group notifications (e.g. "user verified") are batched into one digest per interval (0 = send each one)
+NOTIFY_DIGEST_SECONDS = int(environ.get("NOTIFY_DIGEST_SECONDS", "60"))
+
+# 📊 Minimum seconds between progress edits of one upload status message
+PROGRESS_UPDATE_INTERVAL = float(environ.get("PROGRESS_UPDATE_INTERVAL", "5"))
+
+# ⬆️ Parallel upload: concurrent part uploads spread over several media connections (1 = pyrogram's default uploader)
+UPLOAD_WORKERS = int(environ.get("UPLOAD_WORKERS", "8"))
+UPLOAD_CONNECTIONS = int(environ.get("UPLOAD_CONNECTIONS", "4"))
+UPLOAD_PART_RETRIES = int(environ.get("UPLOAD_PART_RETRIES", "5"))
+
+# 🤝 Extra bot tokens used only to upload recordings to STORE_CHANNEL in parallel (comma-separated, must be channel admins)
+HELPER_BOT_TOKENS = [t for t in environ.get("HELPER_BOT_TOKENS", "").replace(",", " ").split() if t]
+
+# 📚 Serve repeat VOD requests from recordings already archived in STORE_CHANNEL
+LIBRARY_ENABLED = environ.get("LIBRARY_ENABLED", "true").lower() == "true"
+LIBRARY_DURATION_TOLERANCE = int(environ.get("LIBRARY_DURATION_TOLERANCE", "2"))  # seconds
+
+# ⚡ Finished (VOD) playlists are fetched segment-by-segment in parallel instead of recorded in real time
+VOD_MODE = environ.get("VOD_MODE", "true").lower() == "true"
+VOD_CONNECTIONS = int(environ.get("VOD_CONNECTIONS", "8"))
+VOD_SEGMENT_RETRIES = int(environ.get("VOD_SEGMENT_RETRIES", "4"))
+
+# 🖼 Number of keyframe thumbnails captured while recording (the most detailed one is used)
+THUMB_CANDIDATES = int(environ.get("THUMB_CANDIDATES", "8"))
+
+# 🎞 Output container: "mkv" or "mp4" (fragmented MP4, streamable in Telegram while downloading)
+OUTPUT_FORMAT = environ.get("OUTPUT_FORMAT", "mkv").lower()
+if OUTPUT_FORMAT not in ("mkv", "mp4"):
+    raise ValueError(f"OUTPUT_FORMAT must be mkv or mp4, not {OUTPUT_FORMAT!r}")
+
+# 🎚 Encoding profiles (see profiles.py); "copy" keeps the source stream untouched
+DEFAULT_PROFILE = environ.get("DEFAULT_PROFILE", "copy")
+FREE_USER_PROFILE = environ.get("FREE_USER_PROFILE", "copy")
+TELEGRAM_MAX_BYTES = int(environ.get("TELEGRAM_MAX_BYTES", str(2000 * 1024 * 1024)))
+ENCODE_SLOTS = int(environ.get("ENCODE_SLOTS", "2"))  # simultaneous encodes
+ENCODE_THREADS = int(environ.get("ENCODE_THREADS", "2"))  # threads per encode
+ENCODE_PRESET = environ.get("ENCODE_PRESET", "veryfast")
+
+# 🧭 Adaptive ffmpeg probing: hosts with a clean history start with small probe values
+ADAPTIVE_PROBE = environ.get("ADAPTIVE_PROBE", "true").lower() == "true"
+PROBE_TRUST_AFTER = int(environ.get("PROBE_TRUST_AFTER", "3"))  # clean recordings before a host is trusted
+PROBE_PENALTY_SECONDS = int(environ.get("PROBE_PENALTY_SECONDS", str(24 * 60 * 60)))
+
+# 🐶 Stall watchdog: restart ingest after STALL_SECONDS without progress, give up after STALL_DEADLINE without data
+STALL_SECONDS = int(environ.get("STALL_SECONDS", "30"))
+STALL_DEADLINE = int(environ.get("STALL_DEADLINE", "180"))
+
+# 📦 Batch requests (several lines in one message, or a .txt/.m3u file)
+BATCH_MAX_ITEMS = int(environ.get("BATCH_MAX_ITEMS", "25"))  # for non-auth users
+BATCH_MAX_FILE_BYTES = int(environ.get("BATCH_MAX_FILE_BYTES", str(256 * 1024)))
+BATCH_PROBE_CONCURRENCY = int(environ.get("BATCH_PROBE_CONCURRENCY", "8"))
+
+# ⏰ Scheduled recordings ("url 00:30:00 name @21:00", in TIMEZONE)
+SCHEDULE_PREWARM_SECONDS = int(environ.get("SCHEDULE_PREWARM_SECONDS", "60"))  # probe the link this long before start
+SCHEDULE_STARTS_PER_SECOND = float(environ.get("SCHEDULE_STARTS_PER_SECOND", "2"))  # stagger bursts of same-time starts
+SCHEDULE_MISSED_GRACE = int(environ.get("SCHEDULE_MISSED_GRACE", "300"))  # still start entries this late after a restart
+SCHEDULE_MAX_PER_USER = int(environ.get("SCHEDULE_MAX_PER_USER", "10"))  # for non-auth users
+
+# 📈 Per-task resource accounting
+ACCOUNTING_SAMPLE_SECONDS = float(environ.get("ACCOUNTING_SAMPLE_SECONDS", "2"))  # output size polling for peak_bytes
+FREE_DAILY_CPU_SECONDS = int(environ.get("FREE_DAILY_CPU_SECONDS", "0"))  # ffmpeg CPU per free user per 24h, 0 = unlimited
+
+# 🔄 Drain mode (SIGTERM or /drain): seconds to let recordings finish, then to upload early-stopped ones
+DRAIN_DEADLINE = int(environ.get("DRAIN_DEADLINE", "300"))
+DRAIN_UPLOAD_GRACE = int(environ.get("DRAIN_UPLOAD_GRACE", "600"))
+
+# 🔗 Pre-shortened verification links kept ready for /verify (0 = shorten on demand)
+VERIFY_POOL_SIZE = int(environ.get("VERIFY_POOL_SIZE", "20"))
+VERIFY_POOL_MAX_AGE = int(environ.get("VERIFY_POOL_MAX_AGE", str(24 * 60 * 60)))  # seconds before an unused link is dropped
+VERIFY_POOL_REFILL_CONCURRENCY = int(environ.get("VERIFY_POOL_REFILL_CONCURRENCY", "4"))  # shortlink calls in flight while refilling
@@ -0,0 +1,176 @@
+import re
+import asyncio
+import hashlib
+from collections import namedtuple
+from urllib.parse import urljoin, urlsplit
+
+import httpx
+
+Segment = namedtuple("Segment", "uri duration start")
+
+VIDEO_CODECS = ("avc1", "avc3", "hvc1", "hev1", "dvh1", "dvhe", "vp09", "av01", "mp4v")
+AUDIO_EXTENSIONS = (".aac", ".mp3", ".m4a", ".ac3", ".ec3")
+
+# Links can be radio streams or huge progressive files: only read what looks like a playlist
+MAX_PLAYLIST_BYTES = 2 * 1024 * 1024
+PLAYLIST_READ_SECONDS = 20
+
+
+class NotAPlaylist(ValueError):
+    pass
+
+
+class Playlist:
+    def __init__(self, url: str):
+        self.url = url
+        self.segments = []
+        self.variants = []
+        self.endlist = False
+        self.encrypted = False
+        self.init_uri = None
+        self.variant_codecs = {}
+        self.variant_audio = {}
+        # TYPE=AUDIO renditions with their own playlist, by GROUP-ID
+        self.audio_groups = {}
+        self.byterange = False
+        # CODECS of the variant this media playlist was reached through, if any
+        self.codecs = None
+        # The variant takes its audio from a separate rendition playlist
+        self.separate_audio = False
+
+    @property
+    def is_master(self) -> bool:
+        return bool(self.variants)
+
+    @property
+    def is_vod(self) -> bool:
+        return self.endlist and bool(self.segments)
+
+    @property
+    def duration(self) -> float:
+        return sum(s.duration for s in self.segments)
+
+    @property
+    def downloadable(self) -> bool:
+        """Finished playlist whose segments vod.download can fetch and join as-is.
+
+        Encrypted segments, byte ranges into one file and audio living in a
+        separate rendition all go through ffmpeg instead.
+        """
+        return self.is_vod and not (self.encrypted or self.byterange or self.separate_audio)
+
+    @property
+    def audio_only(self) -> bool:
+        """True for radio-style streams: an audio-only variant or packed audio segments."""
+        if self.codecs:
+            return not any(c.strip().split(".")[0] in VIDEO_CODECS for c in self.codecs.split(","))
+        return bool(self.segments) and all(
+            urlsplit(s.uri).path.lower().endswith(AUDIO_EXTENSIONS) for s in self.segments
+        )
+
+    def window(self, start: float, length: float):
+        """Segments overlapping [start, start + length)."""
+        end = start + length
+        return [s for s in self.segments if s.start + s.duration > start and s.start < end]
+
+
+def _attr(line: str, name: str):
+    match = re.search(rf'[:,]{name}=("[^"]*"|[^,]*)', line)
+    return match.group(1).strip('"') if match else None
+
+
+def parse_playlist(text: str, url: str) -> Playlist:
+    playlist = Playlist(url)
+    duration = None
+    bandwidth = None
+    codecs = None
+    audio_group = None
+    position = 0.0
+
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+        if line.startswith("#EXTINF:"):
+            duration = float(line[8:].split(",", 1)[0] or 0)
+        elif line.startswith("#EXT-X-STREAM-INF:"):
+            bandwidth = int(_attr(line, "BANDWIDTH") or 0)
+            codecs = _attr(line, "CODECS")
+            audio_group = _attr(line, "AUDIO")
+        elif line.startswith("#EXT-X-MEDIA:"):
+            if _attr(line, "TYPE") == "AUDIO" and _attr(line, "URI"):
+                playlist.audio_groups[_attr(line, "GROUP-ID")] = urljoin(url, _attr(line, "URI"))
+        elif line.startswith("#EXT-X-BYTERANGE"):
+            playlist.byterange = True
+        elif line.startswith("#EXT-X-ENDLIST"):
+            playlist.endlist = True
+        elif line.startswith("#EXT-X-KEY:"):
+            playlist.encrypted = (_attr(line, "METHOD") or "NONE") != "NONE"
+        elif line.startswith("#EXT-X-MAP:"):
+            playlist.init_uri = urljoin(url, _attr(line, "URI"))
+            playlist.byterange = playlist.byterange or _attr(line, "BYTERANGE") is not None
+        elif not line.startswith("#"):
+            uri = urljoin(url, line)
+            if bandwidth is not None:
+                playlist.variants.append((bandwidth, uri))
+                playlist.variant_codecs[uri] = codecs
+                playlist.variant_audio[uri] = audio_group
+                bandwidth = None
+            elif duration is not None:
+                playlist.segments.append(Segment(uri, duration, position))
+                position += duration
+                duration = None
+    return playlist
+
+
+async def _read_playlist(client: httpx.AsyncClient, url: str):
+    """(text, final url) of `url`, refusing anything that isn't a small m3u8."""
+    async with client.stream("GET", url) as resp:
+        resp.raise_for_status()
+        is_m3u8_type = "mpegurl" in resp.headers.get("content-type", "").lower()
+        body = b""
+        checked = is_m3u8_type
+        async for chunk in resp.aiter_bytes():
+            body += chunk
+            if not checked and len(body) >= 16:
+                if not body.lstrip(b"\xef\xbb\xbf \r\n\t").startswith(b"#EXTM3U"):
+                    raise NotAPlaylist(f"{url} is not an HLS playlist")
+                checked = True
+            if len(body) > MAX_PLAYLIST_BYTES:
+                raise NotAPlaylist(f"{url} is larger than {MAX_PLAYLIST_BYTES} bytes")
+        if not checked and not body.lstrip(b"\xef\xbb\xbf \r\n\t").startswith(b"#EXTM3U"):
+            raise NotAPlaylist(f"{url} is not an HLS playlist")
+        return body.decode("utf-8", "replace"), str(resp.url)
+
+
+async def fetch_playlist(url: str, client: httpx.AsyncClient = None) -> Playlist:
+    """Fetch `url`, following a master playlist to its highest-bandwidth variant.
+
+    Raises NotAPlaylist for non-HLS links (radio streams, plain video files)
+    without downloading them.
+    """
+    own_client = client is None
+    client = client or httpx.AsyncClient(follow_redirects=True, timeout=15)
+    try:
+        text, final_url = await asyncio.wait_for(_read_playlist(client, url), PLAYLIST_READ_SECONDS)
+        playlist = parse_playlist(text, final_url)
+        if playlist.is_master:
+            _, variant = max(playlist.variants)
+            codecs = playlist.variant_codecs.get(variant)
+            separate_audio = playlist.variant_audio.get(variant) in playlist.audio_groups
+            text, final_url = await asyncio.wait_for(_read_playlist(client, variant), PLAYLIST_READ_SECONDS)
+            playlist = parse_playlist(text, final_url)
+            playlist.codecs = codecs
+            playlist.separate_audio = separate_audio
+        return playlist
+    finally:
+        if own_client:
+            await client.aclose()
+
+
+def fingerprint(segments) -> str:
+    """Stable content id for a run of segments, ignoring signed query strings."""
+    digest = hashlib.sha1()
+    for seg in segments:
+        digest.update(f"{urlsplit(seg.uri).path}|{seg.duration:.3f}\n".encode())
+    return digest.hexdigest()
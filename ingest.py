@@ -0,0 +1,198 @@
+import os
+import time
+import shlex
+import asyncio
+import logging
+
+import config
+import probe_cache
+
+LOG = logging.getLogger(__name__)
+
+RECONNECT_ARGS = "-reconnect 1 -reconnect_streamed 1 -reconnect_on_network_error 1 -reconnect_delay_max 5 "
+STDERR_TAIL = 64 * 1024
+VIDEO_MAPS = "-map 0:v -map 0:a"
+NO_VIDEO_MARKER = "Stream map '0:v' matches no streams"
+
+
+class NoVideoStream(Exception):
+    """The source turned out to be audio-only; record it again with audio maps."""
+
+
+async def _run_part(cmd: str, output: str, task_entry: dict):
+    """Run one ffmpeg ingest, killing it if neither the file nor its timestamps advance.
+
+    Returns (returncode, stderr tail, stalled, seconds written, start latency).
+    """
+    spawned = time.monotonic()
+    process = await asyncio.create_subprocess_exec(
+        *shlex.split(cmd),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    # 🔗 Save the process object in user_status for later cancellation
+    task_entry["process"] = process
+
+    state = {"out_time": 0.0, "size": 0, "advanced": time.monotonic(), "latency": None, "total_size": 0}
+    stderr_tail = bytearray()
+
+    async def read_progress():
+        # -progress pipe:1 prints key=value blocks; out_time_us is the muxed stream position
+        async for line in process.stdout:
+            key, _, value = line.decode(errors="replace").strip().partition("=")
+            if key == "out_time_us" and value.isdigit():
+                out_time = int(value) / 1000000
+                if out_time > state["out_time"]:
+                    state["out_time"] = out_time
+                    state["advanced"] = time.monotonic()
+            elif key == "total_size" and value.isdigit():
+                state["total_size"] = int(value)
+
+    async def read_stderr():
+        async for line in process.stderr:
+            stderr_tail.extend(line)
+            del stderr_tail[:-STDERR_TAIL]
+
+    async def watchdog():
+        while True:
+            await asyncio.sleep(1)
+            size = os.path.getsize(output) if os.path.exists(output) else 0
+            if size > state["size"]:
+                if state["latency"] is None:
+                    state["latency"] = time.monotonic() - spawned
+                state["size"] = size
+                state["advanced"] = time.monotonic()
+            if time.monotonic() - state["advanced"] > config.STALL_SECONDS:
+                LOG.warning(f"[Watchdog] No progress for {config.STALL_SECONDS}s on {output}, restarting ingest")
+                process.terminate()
+                await asyncio.sleep(5)
+                if process.returncode is None:
+                    process.kill()
+                return True
+
+    readers = asyncio.gather(read_progress(), read_stderr())
+    watch = asyncio.create_task(watchdog())
+    try:
+        await readers
+        await process.wait()
+    finally:
+        stalled = watch.done() and not watch.cancelled() and watch.result()
+        watch.cancel()
+
+    err = stderr_tail.decode(errors="replace")
+    # Network input comes in through recv(), which no /proc counter sees; the
+    # muxed bytes are the closest measure of what was pulled from the source
+    stats = task_entry.get("stats")
+    if stats:
+        stats.add_ffmpeg(err, state["total_size"])
+    return process.returncode, err, stalled, state["out_time"], state["latency"]
+
+
+async def _stitch(parts, output: str, container_args: str, task_entry: dict):
+    list_path = f"{output}.parts.txt"
+    with open(list_path, "w") as f:
+        for part in parts:
+            f.write(f"file '{os.path.abspath(part)}'\n")
+    stitched = f"{output}.stitched{os.path.splitext(output)[1]}"
+    cmd = (
+        f'ffmpeg -y -benchmark -f concat -safe 0 -i "{list_path}" -map 0 -c copy '
+        f'-metadata title="ToonEncodes" {container_args}"{stitched}"'
+    )
+    process = await asyncio.create_subprocess_exec(
+        *shlex.split(cmd), stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    _, stderr = await process.communicate()
+    err = stderr.decode(errors="replace")
+    if task_entry.get("stats"):
+        task_entry["stats"].add_ffmpeg(err)
+    if process.returncode != 0:
+        raise Exception(f"FFmpeg stitch error:\n{err}")
+    os.replace(stitched, output)
+    os.remove(list_path)
+    for part in parts[1:]:
+        os.remove(part)
+
+
+async def record_stream(url, output, total_seconds, start_seconds, codec_args, input_args,
+                        container_args, extra_output, task_entry, is_active, maps=VIDEO_MAPS,
+                        seekable=False):
+    """Record `total_seconds` of `url` into `output`, surviving source stalls.
+
+    A stalled ingest is killed and restarted with reconnect options for the
+    remaining time; the pieces are joined copy-only at the end. If the source
+    produces nothing for STALL_DEADLINE seconds the task fails early so its
+    slot is freed. `seekable` sources (finished VODs) resume exactly where the
+    last part ended; live ones continue from "now". A source without video raises NoVideoStream after
+    the first attempt, without touching the host's probe history.
+    """
+    seek = f"-ss {start_seconds} " if start_seconds else ""
+    probe_values = probe_cache.choose(url)
+    parts = []
+    remaining = total_seconds
+    part_path = output
+    dead_since = None
+    reconnect = ""
+
+    while True:
+        probesize, analyzeduration = probe_values
+        cmd = (
+            f'ffmpeg -y -nostats -benchmark -progress pipe:1 -probesize {probesize} -analyzeduration {analyzeduration} '
+            f'{reconnect}{input_args}{seek}-i "{url}" {maps} {codec_args} -t {remaining} '
+            f'-metadata title="ToonEncodes" {container_args}"{part_path}" {extra_output}'
+        )
+        returncode, err, stalled, written, latency = await _run_part(cmd, part_path, task_entry)
+        # Stream lists come from the container header (TS PMT, MP4 moov), not from
+        # the probe window, so "no video" is an answer rather than a probe failure
+        if returncode != 0 and not parts and not stalled and NO_VIDEO_MARKER in err:
+            raise NoVideoStream(url)
+        if not is_active():
+            raise Exception("Recording cancelled")
+
+        # Drain mode stopped ffmpeg with SIGINT: keep what it finalized and deliver that
+        if task_entry.get("stop_early"):
+            if os.path.exists(part_path) and os.path.getsize(part_path) > 0:
+                parts.append(part_path)
+            if not parts:
+                raise Exception("Stopped before any data was recorded")
+            break
+
+        # Only after the cancel/drain checks: a signalled ffmpeg says nothing about the host
+        if not parts:
+            probe_cache.record(url, probe_values, returncode == 0 or stalled, err, latency)
+
+        if not stalled:
+            # Small probe window missed something: retry once with the safe defaults
+            if returncode != 0 and not parts and probe_values != probe_cache.SAFE:
+                probe_values = probe_cache.SAFE
+                continue
+            if returncode != 0 and not parts:
+                raise Exception(f"FFmpeg error:\n{err}")
+            if returncode == 0 or written > 0:
+                parts.append(part_path)
+            break
+
+        if written > 0:
+            parts.append(part_path)
+            remaining -= int(written)
+            dead_since = None
+        else:
+            dead_since = dead_since or time.monotonic()
+            if time.monotonic() - dead_since > config.STALL_DEADLINE:
+                if parts:
+                    LOG.warning(f"[Watchdog] Source dead for {config.STALL_DEADLINE}s, keeping what was recorded")
+                    break
+                raise Exception(f"Source stalled for more than {config.STALL_DEADLINE}s")
+
+        if remaining <= 1:
+            break
+        # Seekable sources resume where the last part ended; live ones just continue from "now"
+        if seekable or start_seconds:
+            seek = f"-ss {start_seconds + total_seconds - remaining} "
+        else:
+            seek = ""
+        reconnect = RECONNECT_ARGS
+        extra_output = ""
+        part_path = f"{output}.part{len(parts) + 1}{os.path.splitext(output)[1]}" if parts else output
+
+    if len(parts) > 1:
+        await _stitch(parts, output, container_args, task_entry)
@@ -0,0 +1,97 @@
+import time
+import logging
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from pymongo import ASCENDING
+
+import config
+import hls
+from verify import db
+
+LOG = logging.getLogger(__name__)
+
+# -----------------------
+# 📚 Stored recordings index
+# -----------------------
+recordings = db["recordings"]
+recordings.create_index([("url", ASCENDING), ("fingerprint", ASCENDING), ("start", ASCENDING), ("duration", ASCENDING)])
+
+# Query keys that only carry signatures/expiry and change between otherwise identical links
+VOLATILE_QUERY_KEYS = {
+    "token", "expires", "exp", "expiry", "sig", "signature", "hdnts", "hdnea", "hmac",
+    "policy", "key-pair-id", "x-amz-signature", "x-amz-date", "x-amz-expires", "_",
+}
+
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in VOLATILE_QUERY_KEYS
+    )
+    return urlunsplit((parts.scheme.lower(), host, parts.path, urlencode(query), ""))
+
+
+def fingerprint_window(playlist, seconds: int, start: int = 0):
+    """Content fingerprint of the requested window, or None for live sources.
+
+    Live playlists are never indexed: the same URL yields different content
+    on every request.
+    """
+    if playlist is None or not playlist.is_vod:
+        return None
+    return hls.fingerprint(playlist.window(start, seconds))
+
+
+def lookup(url: str, seconds: int, fingerprint: str, start: int = 0, profile: str = "copy"):
+    return recordings.find_one({
+        "url": normalize_url(url),
+        "fingerprint": fingerprint,
+        "start": start,
+        "profile": profile,
+        "duration": {
+            "$gte": seconds - config.LIBRARY_DURATION_TOLERANCE,
+            "$lte": seconds + config.LIBRARY_DURATION_TOLERANCE,
+        },
+    })
+
+
+def store(url: str, seconds: int, fingerprint: str, file_id: str, store_message_id: int = None,
+          start: int = 0, profile: str = "copy", **extra):
+    recordings.update_one(
+        {"url": normalize_url(url), "fingerprint": fingerprint, "start": start, "profile": profile, "duration": seconds},
+        {"$set": {
+            "file_id": file_id,
+            "store_message_id": store_message_id,
+            "stored_at": int(time.time()),
+            **extra,
+        }},
+        upsert=True,
+    )
+
+
+async def send_from_library(bot, chat_id: int, doc, caption: str, reply_to_message_id: int = None):
+    """Send an indexed recording by file_id, refreshing the file_id from STORE_CHANNEL if it went stale."""
+    try:
+        return await bot.send_cached_media(
+            chat_id=chat_id, file_id=doc["file_id"], caption=caption, reply_to_message_id=reply_to_message_id
+        )
+    except Exception as e:
+        if not doc.get("store_message_id"):
+            recordings.delete_one({"_id": doc["_id"]})
+            raise
+        LOG.info(f"[Library] Refreshing file_id for {doc['url']}: {e}")
+
+    stored = await bot.get_messages(config.STORE_CHANNEL_ID, doc["store_message_id"])
+    media = stored and (stored.video or stored.document or stored.audio)
+    if not media:
+        recordings.delete_one({"_id": doc["_id"]})
+        raise LookupError("Stored recording no longer exists")
+
+    recordings.update_one({"_id": doc["_id"]}, {"$set": {"file_id": media.file_id}})
+    return await bot.send_cached_media(
+        chat_id=chat_id, file_id=media.file_id, caption=caption, reply_to_message_id=reply_to_message_id
+    )
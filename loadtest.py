@@ -0,0 +1,198 @@
+"""Load test for the verification path: is_user_verified, /verify and /verify_callback.
+
+    python loadtest.py --mongomock --concurrency 1,8,32,128
+    MONGO_URI=mongodb://localhost:27017 python loadtest.py --requests 5000 --json before.json
+
+Runs against a local Mongo stand-in (a throwaway mongod via MONGO_URI, or
+in-process mongomock with --mongomock) and a mock shortlink API with
+configurable latency. /verify goes through main.verify_handler with the stub
+Telegram client from soak.py; the callback is posted to verify_api.app
+in-process over ASGI. For every path and concurrency level it prints
+throughput and p50/p99 latency, so caching and indexing changes can be
+compared run against run.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+from types import SimpleNamespace
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+LOAD_USER_BASE = 8_000_000_000  # synthetic user ids, far from real ones
+
+
+# -----------------------
+# 🔗 Mock shortlink API
+# -----------------------
+def serve_shortlink(latency: float):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            url = parse_qs(urlsplit(self.path).query).get("url", [""])[0]
+            body = json.dumps({"status": "success", "shortenedUrl": url}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# -----------------------
+# 📏 Runner
+# -----------------------
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+async def measure(op, requests: int, concurrency: int) -> dict:
+    """Run `op(i)` for i in range(requests) with `concurrency` workers."""
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                await op(i)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "rps": round(requests / wall, 1),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "errors": errors,
+    }
+
+
+async def run(args, app, verify, verify_api, httpx, stub):
+    bot = stub.StubClient()
+    # Group notifications from the callback and /verify replies go to the stub
+    app.rvbot = verify_api.rvbot = bot
+    group = SimpleNamespace(id=app.config.WORKING_GROUP, type="supergroup")
+    tokens = verify.tokens
+
+    tokens.delete_many({"_id": {"$gte": LOAD_USER_BASE}})
+    # Half verified, half expired, so both branches of the check are hit
+    now = int(time.time())
+    tokens.insert_many([
+        {"_id": LOAD_USER_BASE + i, "token": f"load-{i}", "username": f"load{i}",
+         "verified": True, "expires_at": now + 3600 if i % 2 else now - 1}
+        for i in range(args.users)
+    ])
+
+    pool_task = None
+    if app.config.VERIFY_POOL_SIZE > 0:
+        pool_task = asyncio.create_task(verify.fill_verification_pool(bot))
+        while len(verify.link_pool) < app.config.VERIFY_POOL_SIZE:
+            await asyncio.sleep(0.05)
+
+    fresh = iter(range(args.users, 10 ** 9))
+    transport = httpx.ASGITransport(app=verify_api.app)
+    api = httpx.AsyncClient(transport=transport, base_url="http://verify-api")
+
+    async def check_verified(i):
+        app.is_user_verified(LOAD_USER_BASE + i % args.users)
+
+    async def verify_cmd(i):
+        user = SimpleNamespace(id=LOAD_USER_BASE + next(fresh), username=None, first_name="Load")
+        await app.verify_handler(bot, stub.StubMessage(bot, group, user, "/verify"))
+
+    async def callback(i):
+        resp = await api.post("/verify_callback", json={"token": f"load-{i % args.users}"})
+        if resp.json().get("status") != "success":
+            raise ValueError(resp.text)
+
+    paths = {"is_user_verified": check_verified, "/verify": verify_cmd, "/verify_callback": callback}
+    results = []
+    print(f"{'path':<18} {'conc':>5} {'reqs':>6} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    try:
+        for name, op in paths.items():
+            for concurrency in args.concurrency:
+                row = await measure(op, args.requests, concurrency)
+                row["path"] = name
+                results.append(row)
+                print(
+                    f"{name:<18} {concurrency:>5} {row['requests']:>6} {row['rps']:>9} "
+                    f"{row['p50_ms']:>8} {row['p99_ms']:>8} {row['errors']:>6}",
+                    flush=True,
+                )
+    finally:
+        await api.aclose()
+        if pool_task:
+            pool_task.cancel()
+        tokens.delete_many({"_id": {"$gte": LOAD_USER_BASE}})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000, help="requests per path and concurrency level")
+    parser.add_argument("--concurrency", default="1,8,32,128",
+                        type=lambda v: [int(c) for c in v.split(",")])
+    parser.add_argument("--users", type=int, default=10000, help="token documents seeded before the run")
+    parser.add_argument("--shortlink-latency", type=float, default=0.2, help="seconds the mock API takes")
+    parser.add_argument("--pool", type=int, default=None, help="override VERIFY_POOL_SIZE (0 disables the pool)")
+    parser.add_argument("--mongomock", action="store_true", help="use in-process mongomock instead of MONGO_URI")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    if args.mongomock:
+        import mongomock
+        import pymongo
+        # Must happen before verify/main/verify_api create their clients; one
+        # shared instance so they all see the same in-memory data
+        client = mongomock.MongoClient()
+        pymongo.MongoClient = lambda *args, **kwargs: client
+    elif "MONGO_URI" not in os.environ:
+        sys.exit("Set MONGO_URI to a throwaway MongoDB or pass --mongomock; the test writes to verifyDB.")
+
+    server, base_url = serve_shortlink(args.shortlink_latency)
+    os.environ.update({
+        "ENABLE_SHORTLINK": "true",
+        "SHORTLINK_URL": base_url,
+        "OUTBOUND_GLOBAL_RATE": "0",
+        "OUTBOUND_PRIVATE_INTERVAL": "0",
+        "OUTBOUND_GROUP_INTERVAL": "0",
+        "NOTIFY_DIGEST_SECONDS": "0",
+    })
+    if args.pool is not None:
+        os.environ["VERIFY_POOL_SIZE"] = str(args.pool)
+
+    import httpx
+    import main as app
+    import verify
+    import verify_api
+    import soak as stub
+
+    try:
+        results = asyncio.get_event_loop().run_until_complete(run(args, app, verify, verify_api, httpx, stub))
+    finally:
+        server.shutdown()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,43 @@
 import os
 import re
+import json
 import time
 import logging
 import random
 import shlex
-import secrets
 import pytz
 import shutil
+import signal
 import asyncio
 import traceback
-import httpx
 from typing import Tuple
 from os.path import join
 from verify import send_verification_message, is_user_verified
 from verify import complete_verification
+from verify import verification_link, already_verified_reply, fill_verification_pool
 from datetime import datetime, timedelta
 from hachoir.metadata import extractMetadata
 from hachoir.parser import createParser
 from pyrogram import Client, filters
 from verify_api import tokens
+from outbound import for_client, message_key
+import uploader
+import upload_pool
+import library
+import hls
+import vod
+import profiles
+import batch
+import scheduler
+import accounting
+import ingest
+import profiler
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 import config
 from config import (
     ENABLE_SHORTLINK,
     WORKING_GROUP,
     AUTH_USERS,
-    SHORTLINK_URL,
-    SHORTLINK_API,
     VERIFICATION_EXPIRY_SECONDS,
 )
 
@@ -34,18 +45,43 @@ logging.basicConfig(level=logging.INFO)
 LOG = logging.getLogger(__name__)
 
 rvbot = Client("recorder", bot_token=config.BOT_TOKEN, api_id=config.API_ID, api_hash=config.API_HASH)
+outbound = for_client(rvbot)
 
 user_status = {}
 user_tasks = {}
 
 STATUS_PAGE_SIZE = 5
 
+encode_slots = asyncio.Semaphore(config.ENCODE_SLOTS)
+# 🔄 Drain mode: set on SIGTERM or /drain, no new recordings are admitted
+draining = False
+shutdown = asyncio.Event()
+DRAIN_TEXT = "🔄 The bot is restarting for an update. Please send your link again in a minute."
+
+# "url 00:30:00 name @21:00" → start at 21:00 in config.TIMEZONE
+SCHEDULE_RE = re.compile(r"(?:^|\s)@(\d{1,2}):(\d{2})$")
+
+# Notified whenever a recording ends, so queued batch items can re-check admission
+task_finished = asyncio.Condition()
+
+# Output container -> (file extension, ffmpeg muxer flags)
+OUTPUT_FORMATS = {
+    "mkv": ("mkv", ""),
+    # Fragmented: playable while still downloading, and never rewritten by a
+    # +faststart second pass, so stopped or stitched recordings stay valid
+    "mp4": ("mp4", "-movflags +frag_keyframe+empty_moov+default_base_moof "),
+}
+# Audio-only recordings (radio, podcasts): AAC/MP3 in a small MP4 audio file. Without
+# video keyframes frag_keyframe never cuts, so fragments are closed every 10 s instead
+AUDIO_FORMAT = ("m4a", "-f mp4 -movflags +frag_keyframe+empty_moov -frag_duration 10000000 ")
+
 async def unauthorized_access(message: Message):
     await message.reply_text(
         f"❌ You cannot access the bot.\n"
         f"Access is allowed only in this group: {config.GROUP_LINK}"
     )
 
+@profiler.timed
 async def cancel_single_task(task_id: int):
     task = None
     user_id = user_tasks.get(task_id)
@@ -67,6 +103,11 @@ async def cancel_single_task(task_id: int):
     if not task:
         return
 
+    # Stop a VOD segment download in progress
+    job = task.get("job")
+    if job and not job.done():
+        job.cancel()
+
     # Stop ffmpeg process
     process = task.get("process")
     if process and process.returncode is None:
@@ -95,11 +136,15 @@ async def cancel_single_task(task_id: int):
                 f"⏱ Time: {start} to {end}"
         )
 
-            await rvbot.send_video(
-                chat_id=chat_id,
-                video=file_path,
-                caption=caption
-            )
+            if task.get("audio"):
+                await rvbot.send_audio(chat_id=chat_id, audio=file_path, caption=caption)
+            else:
+                await uploader.send_video(
+                    rvbot,
+                    chat_id=chat_id,
+                    video=file_path,
+                    caption=caption
+                )
         except Exception as e:
             LOG.warning(f"[Cancel] Failed to send video: {e}")
 
@@ -130,6 +175,13 @@ def authorized_only_cb(func):
 def sanitize_filename(name: str) -> str:
     return re.sub(r'[\\/:"*?<>|]+', "", name).strip()
 
+def parse_hms(value: str) -> int:
+    parts = value.split(":")
+    if len(parts) != 3:
+        raise ValueError("Timestamp must be in hh:mm:ss format.")
+    h, m, s = map(int, parts)
+    return h * 3600 + m * 60 + s
+
 def build_status_page(page: int, bot: Client):
     users = list(user_status.items())
     total_pages = (len(users) + STATUS_PAGE_SIZE - 1) // STATUS_PAGE_SIZE
@@ -276,43 +328,11 @@ def is_user_verified(user_id: int) -> bool:
 async def send_verification_message(bot: Client, message: Message):
     user_id = message.from_user.id
     username = message.from_user.username or message.from_user.first_name
-    now = int(time.time())
-
-    existing = tokens.find_one({"_id": user_id})
-    if existing:
-        expires_at = existing.get("expires_at", 0)
-        if existing.get("verified") and now < expires_at:
-            remaining = expires_at - now
-            return await message.reply(
-                f"✅ You are already verified.\n"
-                f"⏳ Remaining time: {remaining // 3600}h {(remaining % 3600) // 60}m",
-                quote=True
-            )
-
-    token = secrets.token_urlsafe(12)
-    tokens.update_one(
-        {"_id": user_id},
-        {"$set": {
-            "token": token,
-            "username": username,
-            "verified": False,
-            "expires_at": now + VERIFICATION_EXPIRY_SECONDS
-        }},
-        upsert=True
-    )
-
-    bot_username = (await bot.get_me()).username
-    verify_url = f"https://t.me/{bot_username}?start=verify_{token}"
 
-    api_url = f"{SHORTLINK_URL}/api?api={SHORTLINK_API}&url={verify_url}"
-
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(api_url)
-        data = resp.json()
-        if data.get("status") == "success":
-            shortlink = data.get("shortenedUrl")
-        else:
-            shortlink = verify_url
+    # Bound from the pre-shortened pool with one write; no API round trip while the user waits
+    shortlink = await verification_link(bot, user_id, username)
+    if shortlink is None:
+        return await already_verified_reply(message)
 
     markup = InlineKeyboardMarkup([
         [InlineKeyboardButton("🔗 Verify Here", url=shortlink)]
@@ -416,6 +436,7 @@ async def statusme_handler(client, message):
     await message.reply(status_text)
 
 @rvbot.on_message(filters.command("cancel"))
+@profiler.timed
 async def cancel_by_admin(bot, message):
     if message.from_user.id not in config.AUTH_USERS:
         return await message.reply("⛔ You are not authorized to use this command.")
@@ -432,6 +453,7 @@ async def cancel_by_admin(bot, message):
     await message.reply("👥 Select user to cancel recording:", reply_markup=markup)
 
 @rvbot.on_callback_query(filters.regex(r"^cancel_user_(\d+)$"))
+@profiler.timed
 async def confirm_cancel_user(bot, query):
     user_id = int(query.matches[0].group(1))
     tasks = user_status.get(user_id, [])
@@ -454,6 +476,7 @@ async def confirm_cancel_user(bot, query):
 
 @rvbot.on_callback_query(filters.regex(r"^cancel_task_(\d+)$"))
 @authorized_only
+@profiler.timed
 async def on_cancel_task(bot, query):
     task_id = int(query.matches[0].group(1))
     await cancel_single_task(task_id)
@@ -462,6 +485,7 @@ async def on_cancel_task(bot, query):
 
 @rvbot.on_callback_query(filters.regex(r"^cancel_all_(\d+)$"))
 @authorized_only
+@profiler.timed
 async def confirm_cancel_all(bot, query):
     user_id = int(query.matches[0].group(1))
     await query.answer()
@@ -479,11 +503,13 @@ async def confirm_cancel_all(bot, query):
         await query.message.edit_text(f"✅ All ({count}) tasks cancelled for user.")
 
 @rvbot.on_callback_query(filters.regex(r"^cancel_exit$"))
+@profiler.timed
 async def cancel_exit(bot, query):
     await query.message.delete()
     await query.answer()
 
 @rvbot.on_callback_query(filters.regex(r"^cancel_back$"))
+@profiler.timed
 async def cancel_back(bot, query):
     if not user_status:
         await query.message.edit_text("⚠️ No active recording users.")
@@ -499,6 +525,106 @@ async def cancel_back(bot, query):
     await query.message.edit_text("👥 Select user to cancel recording:", reply_markup=markup)
     await query.answer()
 
+async def drain(reason: str):
+    """Stop admitting recordings, let running ones finish, then shut down.
+
+    Tasks still recording after DRAIN_DEADLINE get SIGINT, which makes ffmpeg
+    finalize the file; they are then uploaded as usual. The process exits once
+    no task is left or DRAIN_UPLOAD_GRACE has also passed.
+    """
+    global draining
+    if draining:
+        return
+    draining = True
+    LOG.info(f"[Drain] Started ({reason}), {len(user_tasks)} task(s) in flight")
+    # Wake batches waiting for a slot so they stop queueing
+    async with task_finished:
+        task_finished.notify_all()
+
+    async def wait_idle(timeout):
+        try:
+            async with task_finished:
+                await asyncio.wait_for(task_finished.wait_for(lambda: not user_tasks), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    if not await wait_idle(config.DRAIN_DEADLINE):
+        LOG.info(f"[Drain] Deadline reached, stopping {len(user_tasks)} task(s) early")
+        for tasks in list(user_status.values()):
+            for task in tasks:
+                task["stop_early"] = True
+                process = task.get("process")
+                if process and process.returncode is None:
+                    process.send_signal(signal.SIGINT)
+        await wait_idle(config.DRAIN_UPLOAD_GRACE)
+
+    LOG.info("[Drain] Done, shutting down")
+    shutdown.set()
+
+@rvbot.on_message(filters.command("drain"))
+async def drain_cmd(bot, message):
+    if message.from_user.id not in config.AUTH_USERS:
+        return await message.reply("⛔ You are not authorized to use this command.")
+    if draining:
+        return await message.reply(f"🔄 Already draining, {len(user_tasks)} task(s) left.")
+    await message.reply(
+        f"🔄 Drain started: no new recordings, {len(user_tasks)} task(s) in flight.\n"
+        f"Running tasks are stopped and uploaded after {config.DRAIN_DEADLINE}s, then the bot exits."
+    )
+    asyncio.create_task(drain(f"/drain by {message.from_user.id}"))
+
+@rvbot.on_message(filters.command("usage"))
+async def usage_cmd(bot, message):
+    if message.from_user.id not in config.AUTH_USERS:
+        return await message.reply("⛔ You are not authorized to use this command.")
+
+    days = int(message.command[1]) if len(message.command) > 1 and message.command[1].isdigit() else 1
+    since = time.time() - days * 86400
+
+    def rows(group_by, label):
+        lines = []
+        for row in accounting.aggregate(group_by, since):
+            name = row.get("username") if group_by == "user_id" else row["_id"]
+            lines.append(
+                f"{label} {name or row['_id']}: {row['tasks']} tasks, "
+                f"CPU {row['cpu_seconds']:.0f}s, in {row['ingest_bytes'] / (1024 * 1024):.0f} MB, "
+                f"peak {row['peak_bytes'] / (1024 * 1024):.0f} MB, wall {TimeFormatter(int(row['wall_seconds'] * 1000))}"
+            )
+        return lines or ["—"]
+
+    text = "\n".join(
+        [f"**📈 Usage — last {days} day(s)**\n", "**Top users:**"] + rows("user_id", "👤")
+        + ["", "**Top hosts:**"] + rows("host", "🌐")
+    )
+    await message.reply_text(text[:4096], disable_web_page_preview=True)
+
+@rvbot.on_message(filters.command("profile"))
+async def profile_cmd(bot, message):
+    if message.from_user.id != config.OWNER_ID:
+        return await outbound.reply(message, "⛔ Only the owner can use this command.")
+    if profiler.active is not None:
+        return await outbound.reply(message, "🔬 A profile is already running.")
+
+    seconds = int(message.command[1]) if len(message.command) > 1 and message.command[1].isdigit() else 30
+    seconds = max(1, min(seconds, 300))
+    await outbound.reply(message, f"🔬 Profiling for {seconds}s...")
+
+    os.makedirs(config.DOWNLOAD_DIRECTORY, exist_ok=True)
+    folded_path = join(config.DOWNLOAD_DIRECTORY, f"profile_{int(time.time())}.folded")
+    try:
+        report = await profiler.sample(seconds, folded_path)
+        await outbound.reply(message, report[:4096], disable_web_page_preview=True)
+        await outbound.call(message.chat.id, lambda: message.reply_document(
+            folded_path, caption="🔥 Folded stacks (flamegraph.pl / speedscope)"
+        ))
+    except Exception as e:
+        LOG.warning(f"[Profile] Failed: {e}")
+        await outbound.reply(message, f"❌ Profile failed: {e}")
+    finally:
+        if os.path.exists(folded_path):
+            os.remove(folded_path)
+
 @rvbot.on_message(filters.command("help"))
 @authorized_only
 async def help_cmd(bot, message):
@@ -506,6 +632,17 @@ async def help_cmd(bot, message):
         "**🛠 Help Menu**\n\n"
         "**To start a recording:**\n"
         "`http://link 00:00:00 My Filename`\n\n"
+        "**To clip a range of a VOD/replay:**\n"
+        "`http://link 01:10:00-01:40:00 My Filename`\n\n"
+        "**Many links at once:** send one request per line, or a .txt/.m3u file "
+        "(for .m3u put the duration in the caption)\n\n"
+        "**Schedule a recording:** add the start time (24h) at the end\n"
+        "`http://link 00:30:00 My Filename @21:00`\n"
+        "/schedules – your scheduled recordings, /unschedule <id> – cancel one\n\n"
+        "**Smaller, faster uploads:** end the name with a profile\n"
+        "`http://link 00:30:00 My Filename #720p`\n"
+        "Radio or podcast? Use `#audio` (streams without video are detected automatically)\n"
+        f"Profiles: {', '.join(profiles.PROFILES)}\n\n"
         "**Commands:**\n"
         "• /status – Check your current recording\n"
         "• /start – Welcome screen\n"
@@ -532,13 +669,12 @@ async def verify_handler(client: Client, message: Message):
     if user_id in AUTH_USERS:
         return await message.reply("✅ You are already authorized. No verification needed.")
 
-    if is_user_verified(user_id):
-        return await message.reply("✅ You are already verified. You can start recording now.")
-
+    # The conditional upsert in bind_verification_token answers "already verified" itself
     await send_verification_message(client, message)
 
 @rvbot.on_message(filters.command("cancelme"))
 @authorized_only
+@profiler.timed
 async def cancelme_handler(bot, message):
     user_id = message.from_user.id
     tasks = user_status.get(user_id, [])
@@ -556,6 +692,7 @@ async def cancelme_handler(bot, message):
     await message.reply("📋 Your active tasks:", reply_markup=markup)
 
 @rvbot.on_callback_query(filters.regex(r"^cancelme_task_(\d+)$"))
+@profiler.timed
 async def cancelme_task_selected(bot, query):
     user_id = query.from_user.id
     task_id = int(query.matches[0].group(1))
@@ -585,6 +722,7 @@ async def cancelme_task_selected(bot, query):
     await query.edit_message_text(caption, reply_markup=kb)
 
 @rvbot.on_callback_query(filters.regex(r"^cancelme_confirm_(\d+)$"))
+@profiler.timed
 async def cancelme_confirm(bot, query):
     user_id = query.from_user.id
     task_id = int(query.matches[0].group(1))
@@ -598,6 +736,7 @@ async def cancelme_confirm(bot, query):
     await query.answer()
 
 @rvbot.on_callback_query(filters.regex("cancelme_back"))
+@profiler.timed
 async def cancelme_back(bot, query):
     user_id = query.from_user.id
     tasks = user_status.get(user_id, [])
@@ -615,6 +754,7 @@ async def cancelme_back(bot, query):
     await query.edit_message_text("📋 Your active tasks:", reply_markup=markup)
 
 @rvbot.on_callback_query(filters.regex("cancelme_exit"))
+@profiler.timed
 async def cancelme_exit(bot, query):
     await query.message.delete()
     await query.answer()
@@ -646,144 +786,570 @@ async def plan_cmd(bot, message):
 
     await message.reply_text(text, reply_markup=markup)
 
-@rvbot.on_message(filters.regex(r"^http.*? \d{2}:\d{2}:\d{2}( .+)?$"))
-@authorized_only
-async def handle_record(bot, message):
-    user_id = message.from_user.id
+class MessageStatus:
+    """Progress sink backed by a single "⏳ Processing..." message."""
+
+    def __init__(self, msg):
+        self.msg = msg
+        self.key = message_key(msg)
+
+    def edit(self, text: str):
+        outbound.edit(self.msg, text)
+
+    # Terminal updates go through the same queue, so a queued or in-flight
+    # progress edit can never land after them
+    async def done(self):
+        last_update.pop(self.key, None)
+        await outbound.delete(self.msg)
+
+    async def fail(self, text: str):
+        last_update.pop(self.key, None)
+        await outbound.finish(self.msg, text)
+
+def admission_error(user_id: int):
+    """Reason the user can't start another recording right now, or None."""
+    return budget_error(user_id) or slot_error(user_id)
+
+def budget_error(user_id: int):
+    # ⛔ Daily CPU budget for free users, from per-task accounting; waiting for a slot won't help
+    if user_id in config.AUTH_USERS:
+        return None
+    if config.FREE_DAILY_CPU_SECONDS > 0 and accounting.cpu_used_today(user_id) >= config.FREE_DAILY_CPU_SECONDS:
+        return "❌ You have used today's processing budget. Please try again later or upgrade to premium."
+    return None
+
+def slot_error(user_id: int):
+    """Concurrency limits only: cheap, in-memory, and cleared when a task ends."""
+    if user_id in config.AUTH_USERS:
+        return None
+    active_tasks = user_status.get(user_id, [])
+    soonest = min((t.get("end_time") for t in active_tasks), default="Unknown")
 
     # ⛔ Per-user task limit (if enabled)
-    if user_id not in config.AUTH_USERS and config.USER_LIMIT_LINK > 0:
-        user_tasks_list = user_status.get(user_id, [])
-        if len(user_tasks_list) >= config.USER_LIMIT_LINK:
-            try:
-                soonest_task = min(user_tasks_list, key=lambda t: t.get("end_time"))
-                end_time_str = soonest_task.get("end_time", "Unknown")
-                return await message.reply_text(
-                    f"❌ Your task is already running.\n"
-                    f"⏳ Expected completion: {end_time_str}"
-                )
-            except Exception:
-                return await message.reply_text("❌ You already have a running task. Please wait.")
+    if config.USER_LIMIT_LINK > 0 and len(active_tasks) >= config.USER_LIMIT_LINK:
+        return (
+            f"❌ Your task is already running.\n"
+            f"⏳ Expected completion: {soonest}"
+        )
 
     # ⛔ Group-wide task limit for non-auth users
-    if user_id not in config.AUTH_USERS and config.LIMIT_LINK > 0:
-        active_tasks = user_status.get(user_id, [])
-        if len(active_tasks) >= config.LIMIT_LINK:
-            try:
-                soonest_task = min(active_tasks, key=lambda t: t.get("end_time"))
-                end_time_str = soonest_task.get("end_time", "Unknown")
-                return await message.reply_text(
-                    f"❌ Group Limit Reached. Please wait until a current task finishes.\n"
-                    f"⏳ Expected time: {end_time_str}"
-                )
-            except Exception:
-                return await message.reply_text("❌ Group Limit Reached. Please wait for a task to complete.")
+    if config.LIMIT_LINK > 0 and len(active_tasks) >= config.LIMIT_LINK:
+        return (
+            f"❌ Group Limit Reached. Please wait until a current task finishes.\n"
+            f"⏳ Expected time: {soonest}"
+        )
+    return None
 
+def verification_error(user_id: int):
     # ✅ Verification for regular users
-    if config.ENABLE_SHORTLINK and user_id not in config.AUTH_USERS:
-        if not is_user_verified(user_id):
-            return await message.reply_text(
-                "❌ You are not a verified user.\n"
-                f"Please use /verify to continue recording. Verification lasts for {config.VERIFICATION_EXPIRY_SECONDS // 3600} hours."
-            )
+    if config.ENABLE_SHORTLINK and user_id not in config.AUTH_USERS and not is_user_verified(user_id):
+        return (
+            "❌ You are not a verified user.\n"
+            f"Please use /verify to continue recording. Verification lasts for {config.VERIFICATION_EXPIRY_SECONDS // 3600} hours."
+        )
+    return None
+
+def parse_record_request(text: str, user_id: int) -> dict:
+    """Parse one `url hh:mm:ss[-hh:mm:ss] [name] [#profile]` line.
+
+    Raises ValueError with a message that can be shown to the user.
+    """
+    parts = text.strip().split(" ", 2)
+    if len(parts) < 2 or not parts[0].startswith("http"):
+        raise ValueError("❌ Use the format: `http://link 00:00:00 My Filename`")
+    url = parts[0]
+    timestamp = parts[1]
+    raw_filename = parts[2].strip() if len(parts) > 2 else ""
+    # Optional trailing "#profile" picks an encoding profile, e.g. "My Show #720p"
+    profile_match = re.search(r"(?:^|\s)#(\w+)$", raw_filename)
+    profile = profiles.resolve(profile_match.group(1) if profile_match else None, user_id)
+    # Only a known profile is a tag; "Episode #12" keeps its number
+    if profile_match and profile_match.group(1).lower() in profiles.PROFILES:
+        raw_filename = raw_filename[:profile_match.start()].strip()
+    raw_filename = sanitize_filename(raw_filename or "@Toonix_India")
 
-    task_id = int(time.time() * 1000) + random.randint(1, 999)
-    msg = await message.reply_text("⏳ Processing...")
+    try:
+        # "hh:mm:ss" records from the start, "hh:mm:ss-hh:mm:ss" clips a range
+        if "-" in timestamp:
+            range_start, range_end = timestamp.split("-", 1)
+            start_seconds = parse_hms(range_start)
+            total_seconds = parse_hms(range_end) - start_seconds
+        else:
+            start_seconds = 0
+            total_seconds = parse_hms(timestamp)
+    except ValueError:
+        raise ValueError(
+            "❌ Invalid timestamp format. Use hh:mm:ss (e.g., 00:45:00) "
+            "or a range hh:mm:ss-hh:mm:ss (e.g., 01:10:00-01:40:00)."
+        )
+    if "-" in timestamp and total_seconds <= 0:
+        raise ValueError("❌ Range end must be after its start.")
+
+    # Enforce max duration for non-auth users
+    if user_id not in config.AUTH_USERS and total_seconds > config.MAX_DURATION_SEC:
+        max_h = config.MAX_DURATION_SEC // 3600
+        max_m = (config.MAX_DURATION_SEC % 3600) // 60
+        max_s = config.MAX_DURATION_SEC % 60
+        raise ValueError(
+            f"❌ This plan supports only up to {max_h:02}:{max_m:02}:{max_s:02} per recording.\n"
+            "Upgrade to premium to unlock longer durations."
+        )
 
-    save_dir = None
+    error = profiles.size_error(profile, total_seconds)
+    if error:
+        raise ValueError(error)
+
+    return {
+        "url": url,
+        "timestamp": timestamp,
+        "start_seconds": start_seconds,
+        "total_seconds": total_seconds,
+        "raw_filename": raw_filename,
+        "profile": profile,
+    }
+
+async def fetch_playlist_for(req: dict):
+    if not (config.LIBRARY_ENABLED or config.VOD_MODE or req["start_seconds"]):
+        return None
     try:
-        parts = message.text.strip().split(" ", 2)
-        url = parts[0]
-        timestamp = parts[1]
-        raw_filename = parts[2].strip() if len(parts) > 2 and parts[2].strip() else "@Toonix_India"
-        raw_filename = sanitize_filename(raw_filename)
-        filename = f"{raw_filename}.mkv"
-
-        save_dir = os.path.join(config.DOWNLOAD_DIRECTORY, str(int(time.time())))
-        os.makedirs(save_dir, exist_ok=True)
-        video_path = os.path.join(save_dir, filename)
+        return await hls.fetch_playlist(req["url"])
+    except Exception as e:
+        LOG.info(f"Could not read playlist, falling back to ffmpeg: {e}")
+        return None
+
+def range_error(req: dict, playlist):
+    if req["start_seconds"] and playlist and not playlist.is_vod:
+        return "❌ Time ranges only work for finished (VOD/replay) streams. Use hh:mm:ss for live links."
+    if req["start_seconds"] and playlist and req["start_seconds"] >= playlist.duration:
+        return f"❌ This video is only {TimeFormatter(int(playlist.duration * 1000))} long; the range starts after its end."
+    return None
+
+@rvbot.on_message(filters.regex(r"^http.*? \d{2}:\d{2}:\d{2}(-\d{2}:\d{2}:\d{2})?( .+)?$"))
+@authorized_only
+@profiler.timed
+async def handle_record(bot, message):
+    user_id = message.from_user.id
+
+    if draining:
+        return await outbound.reply(message, DRAIN_TEXT)
+
+    error = verification_error(user_id)
+    if error:
+        return await outbound.reply(message, error)
 
+    # ⏰ Trailing "@HH:MM" schedules the recording instead of starting it now;
+    # slots and budget are checked by dispatch_scheduled at start time
+    text = message.text.strip()
+    schedule_match = SCHEDULE_RE.search(text)
+    if schedule_match:
+        text = text[:schedule_match.start()].rstrip()
         try:
-            parts = timestamp.split(":")
-            if len(parts) != 3:
-                raise ValueError("Timestamp must be in hh:mm:ss format.")
-            duration_parts = list(map(int, parts))
-            total_seconds = duration_parts[0]*3600 + duration_parts[1]*60 + duration_parts[2]
-
-            # Enforce max duration for non-auth users
-            if user_id not in config.AUTH_USERS and total_seconds > config.MAX_DURATION_SEC:
-                max_h = config.MAX_DURATION_SEC // 3600
-                max_m = (config.MAX_DURATION_SEC % 3600) // 60
-                max_s = config.MAX_DURATION_SEC % 60
-                await msg.edit(
-                    f"❌ This plan supports only up to {max_h:02}:{max_m:02}:{max_s:02} per recording.\n"
-                    "Upgrade to premium to unlock longer durations."
-                )
-                return
-        except Exception:
-            await msg.edit("❌ Invalid timestamp format. Use hh:mm:ss (e.g., 00:45:00).")
-            return
+            parse_record_request(text, user_id)
+        except ValueError as e:
+            return await outbound.reply(message, str(e))
+        return await schedule_recording(message, text, schedule_match)
 
-        tz = pytz.timezone(config.TIMEZONE)
-        now = datetime.now(tz)
-        formatted_date = now.strftime("%d-%m-%Y")
-        start_time = datetime.now(tz)
-        end_time = start_time + timedelta(seconds=total_seconds)
-
-        user_tasks[task_id] = user_id
-        if user_id not in user_status:
-            user_status[user_id] = []
-        user_status[user_id].append({
-            "id": task_id,
-            "filename": raw_filename,
-            "target": timestamp,
-            "progress": "00:00:00",
-            "Date": formatted_date,
-            "start_time": start_time.strftime("%I:%M:%S %p"),
-            "end_time": end_time.strftime("%I:%M:%S %p"),
-            "username": message.from_user.username or message.from_user.first_name or "anonymous",
-            "output": video_path,
-            "folder": save_dir,
-            "chat_id": message.chat.id,
-            "process": None  # Will be set after starting ffmpeg
-        })
-
-        ffmpeg_cmd = (
-            f'ffmpeg -y -probesize 10000000 -analyzeduration 15000000 '
-            f'-i "{url}" -map 0:v -map 0:a -c:v copy -c:a aac -t {timestamp} "{video_path}"'
-        )
-        process = await asyncio.create_subprocess_exec(
-            *shlex.split(ffmpeg_cmd),
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
+    error = admission_error(user_id)
+    if error:
+        return await outbound.reply(message, error)
+
+    msg = await outbound.reply(message, "⏳ Processing...")
+    status = MessageStatus(msg)
+
+    try:
+        req = parse_record_request(text, user_id)
+    except ValueError as e:
+        return await status.fail(str(e))
+
+    playlist = await fetch_playlist_for(req)
+    error = range_error(req, playlist)
+    if error:
+        return await status.fail(error)
+
+    await run_recording(bot, message, req, status, playlist)
+
+async def schedule_recording(message, text: str, schedule_match):
+    user_id = message.from_user.id
+    if user_id not in config.AUTH_USERS and len(scheduler.pending_for(user_id)) >= config.SCHEDULE_MAX_PER_USER:
+        return await outbound.reply(message, f"❌ You can have at most {config.SCHEDULE_MAX_PER_USER} scheduled recordings.")
+
+    tz = pytz.timezone(config.TIMEZONE)
+    now = datetime.now(tz)
+    hour, minute = int(schedule_match.group(1)), int(schedule_match.group(2))
+    if hour > 23 or minute > 59:
+        return await outbound.reply(message, "❌ Invalid start time. Use @HH:MM (24h).")
+    run_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if run_at <= now:
+        run_at += timedelta(days=1)
+
+    schedule_id = scheduler.add(
+        user_id, message.chat.id, message_key(message)[1], text, run_at.timestamp(),
+        message.from_user.username or message.from_user.first_name or "anonymous"
+    )
+    await outbound.reply(
+        message,
+        f"⏰ Recording scheduled for {run_at.strftime('%d-%m-%Y %I:%M %p')} ({config.TIMEZONE}).\n"
+        f"🆔 `{schedule_id}` — use /unschedule {schedule_id} to cancel."
+    )
+
+async def prewarm_scheduled(doc):
+    """Probe the playlist shortly before start so the recording can begin immediately."""
+    req = parse_record_request(doc["text"], doc["user_id"])
+    scheduler.prewarmed[str(doc["_id"])] = await fetch_playlist_for(req)
+
+async def dispatch_scheduled(doc):
+    schedule_id = str(doc["_id"])
+    if draining:
+        # Hand it back; the next instance's sweep arms pending entries within a minute
+        scheduler.finish_claim(doc, "pending")
+        return
+    playlist = scheduler.prewarmed.pop(schedule_id, None)
+    message = await rvbot.get_messages(doc["chat_id"], doc["message_id"])
+    if not message or message.empty or not message.from_user:
+        scheduler.finish_claim(doc, "failed")
+        return
+
+    user_id = doc["user_id"]
+    error = verification_error(user_id)
+    if error:
+        if scheduler.finish_claim(doc, "failed"):
+            await outbound.send(doc["chat_id"], f"⏰ Scheduled recording skipped.\n{error}")
+        return
+
+    msg = await outbound.send(doc["chat_id"], "⏰ Scheduled recording starting...", reply_to_message_id=doc["message_id"])
+    req = parse_record_request(doc["text"], user_id)
+    playlist = playlist or await fetch_playlist_for(req)
+
+    # ⛔ Same admission limits as everyone else; only slot limits are worth waiting for
+    error = budget_error(user_id)
+    if error:
+        scheduler.finish_claim(doc, "failed")
+        return await outbound.finish(msg, f"⏰ Scheduled recording skipped.\n{error}")
+    async with task_finished:
+        await task_finished.wait_for(lambda: draining or slot_error(user_id) is None)
+    if draining:
+        scheduler.finish_claim(doc, "pending")
+        return await outbound.finish(msg, "⏰ The bot is restarting; this recording will be retried right after.")
+    if not scheduler.finish_claim(doc, "started"):
+        # Lease lost while waiting: another instance owns the entry now
+        LOG.warning(f"[Schedule] Lost the claim on {schedule_id}, not starting it")
+        return await outbound.delete(msg)
+    await run_recording(rvbot, message, req, MessageStatus(msg), playlist)
+
+@rvbot.on_message(filters.command("schedules"))
+@authorized_only
+async def schedules_cmd(bot, message):
+    pending = scheduler.pending_for(message.from_user.id)
+    if not pending:
+        return await message.reply_text("ℹ️ You have no scheduled recordings.")
+
+    tz = pytz.timezone(config.TIMEZONE)
+    lines = ["**⏰ Your Scheduled Recordings:**\n"]
+    for doc in pending:
+        lines.append(
+            f"🆔 `{doc['_id']}`\n"
+            f"🕒 {datetime.fromtimestamp(doc['run_at'], tz).strftime('%d-%m-%Y %I:%M %p')}\n"
+            f"📁 {doc['text'].split(' ', 2)[-1] if doc['text'].count(' ') >= 2 else '@Toonix_India'}\n"
+            "—"
         )
-        # 🔗 Save the process object in user_status for later cancellation
-        user_status[user_id][-1]["process"] = process
+    await message.reply_text("\n".join(lines))
 
-        stdout, stderr = await process.communicate()
-        if process.returncode != 0:
-            raise Exception(f"FFmpeg error:\n{stderr.decode()}")
+@rvbot.on_message(filters.command("unschedule"))
+@authorized_only
+async def unschedule_cmd(bot, message):
+    if len(message.command) < 2:
+        return await message.reply_text("Usage: /unschedule <id>")
+    try:
+        owner = None if message.from_user.id in config.AUTH_USERS else message.from_user.id
+        cancelled = scheduler.cancel(message.command[1], owner)
+    except Exception:
+        cancelled = False
+    if cancelled:
+        await message.reply_text("✅ Scheduled recording cancelled.")
+    else:
+        await message.reply_text("❌ No pending scheduled recording with that ID.")
+
+def is_batch_file(_, __, message):
+    name = (message.document.file_name or "").lower() if message.document else ""
+    return name.endswith((".txt", ".m3u"))
 
-        meta_cmd = (
-            f'ffmpeg -y -i "{video_path}" -map 0 -metadata title="ToonEncodes" '
-            f'-c copy "{video_path}.tmp.mkv"'
+@rvbot.on_message(
+    filters.regex(r"^http\S* \d{2}:\d{2}:\d{2}(-\d{2}:\d{2}:\d{2})?( [^\n]+)?\n")
+    | (filters.document & filters.create(is_batch_file))
+)
+@authorized_only
+async def handle_batch(bot, message):
+    user_id = message.from_user.id
+
+    if draining:
+        return await outbound.reply(message, DRAIN_TEXT)
+
+    error = verification_error(user_id)
+    if error:
+        return await outbound.reply(message, error)
+
+    if message.document:
+        if message.document.file_size > config.BATCH_MAX_FILE_BYTES:
+            return await outbound.reply(message, "❌ Batch file is too large.")
+        path = await message.download(
+            file_name=os.path.join(config.DOWNLOAD_DIRECTORY, f"batch_{message_key(message)[1]}.txt")
         )
+        try:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                text = f.read()
+        finally:
+            os.remove(path)
+        lines = batch.split_lines(text, (message.caption or "").strip() or None)
+    else:
+        lines = batch.split_lines(message.text)
+
+    if not lines:
+        return await outbound.reply(message, "❌ No recording lines found in this batch.")
+    if len(lines) > config.BATCH_MAX_ITEMS and user_id not in config.AUTH_USERS:
+        return await outbound.reply(message, f"❌ A batch can hold at most {config.BATCH_MAX_ITEMS} links.")
+
+    msg = await outbound.reply(message, f"⏳ Checking {len(lines)} links...")
+
+    # ✅ Validate the whole batch before anything is queued
+    requests, errors = [], []
+    for number, line in enumerate(lines, 1):
+        try:
+            requests.append(parse_record_request(line, user_id))
+        except ValueError as e:
+            errors.append(f"Line {number}: {str(e).splitlines()[0]}")
+
+    # 🔎 Pre-probe every playlist once, a few at a time
+    probe_limit = asyncio.Semaphore(config.BATCH_PROBE_CONCURRENCY)
+
+    async def probe(req):
+        async with probe_limit:
+            return await fetch_playlist_for(req)
+
+    playlists = await asyncio.gather(*(probe(req) for req in requests)) if not errors else []
+    for number, (req, playlist) in enumerate(zip(requests, playlists), 1):
+        error = range_error(req, playlist)
+        if error:
+            errors.append(f"Line {number}: {error.splitlines()[0]}")
+
+    if errors:
+        shown = "\n".join(errors[:10])
+        more = f"\n…and {len(errors) - 10} more" if len(errors) > 10 else ""
+        return await outbound.finish(msg, f"❌ Batch rejected, nothing was queued:\n{shown}{more}")
+
+    summary = batch.Batch(outbound, msg, [req["raw_filename"] for req in requests])
+    summary.render()
+
+    jobs = []
+    for index, (req, playlist) in enumerate(zip(requests, playlists)):
+        # ⛔ Same admission limits as single requests: an exhausted budget fails the
+        # rest right away, a busy slot is waited for instead of rejecting
+        error = budget_error(user_id)
+        if error:
+            for rest in range(index, len(requests)):
+                await summary.item(rest).fail(error)
+            break
+        async with task_finished:
+            await task_finished.wait_for(lambda: draining or slot_error(user_id) is None)
+        if draining:
+            for rest in range(index, len(requests)):
+                await summary.item(rest).fail("not started, bot restarting — please resend")
+            break
+        jobs.append(asyncio.create_task(run_recording(bot, message, req, summary.item(index), playlist)))
+        # Let the job register itself in user_status before the next admission check
+        await asyncio.sleep(0)
+
+    await asyncio.gather(*jobs)
+    last_update.pop(summary.key, None)
+
+async def run_recording(bot, message, req: dict, status, playlist=None):
+    """Record, thumbnail, deliver and archive one parsed request.
 
-        retcode, out, err = await runcmd(meta_cmd)
-        if retcode != 0:
-            raise Exception(f"FFmpeg metadata error:\n{err}")
-        os.replace(f"{video_path}.tmp.mkv", video_path)
+    The task is registered in user_status before the first await, so callers
+    that admit several jobs in a row see it counted immediately.
+    """
+    user_id = message.from_user.id
+    url = req["url"]
+    timestamp = req["timestamp"]
+    start_seconds = req["start_seconds"]
+    total_seconds = req["total_seconds"]
+    raw_filename = req["raw_filename"]
+    profile = req["profile"]
 
-        dur = await get_video_duration(video_path)
-        if dur > 10:
-            rand_sec = random.randint(5, dur - 5)
+    task_id = int(time.time() * 1000) + random.randint(1, 999)
+    # 🎧 No video to keep: record only the audio, without thumbnails
+    audio_only = profiles.is_audio_only(profile) or bool(playlist and playlist.audio_only)
+    extension, container_args = AUDIO_FORMAT if audio_only else OUTPUT_FORMATS[config.OUTPUT_FORMAT]
+    # One folder per task so concurrent jobs never share (or clean up) each other's files
+    save_dir = os.path.join(config.DOWNLOAD_DIRECTORY, str(task_id))
+    video_path = os.path.join(save_dir, f"{raw_filename}.{extension}")
+
+    tz = pytz.timezone(config.TIMEZONE)
+    now = datetime.now(tz)
+    formatted_date = now.strftime("%d-%m-%Y")
+    start_time = datetime.now(tz)
+    end_time = start_time + timedelta(seconds=total_seconds)
+
+    user_tasks[task_id] = user_id
+    if user_id not in user_status:
+        user_status[user_id] = []
+    task_entry = {
+        "id": task_id,
+        "filename": raw_filename,
+        "target": timestamp,
+        "progress": "00:00:00",
+        "Date": formatted_date,
+        "start_time": start_time.strftime("%I:%M:%S %p"),
+        "end_time": end_time.strftime("%I:%M:%S %p"),
+        "username": message.from_user.username or message.from_user.first_name or "anonymous",
+        "output": video_path,
+        "folder": save_dir,
+        "chat_id": message.chat.id,
+        "audio": audio_only,
+        "process": None  # Will be set after starting ffmpeg
+    }
+    user_status[user_id].append(task_entry)
+
+    # 📈 Resource accounting, saved to Mongo when the task ends; ingest charges its ffmpeg runs to it
+    stats = accounting.TaskStats(task_id, user_id, task_entry["username"], url, profile, total_seconds)
+    task_entry["stats"] = stats
+    stats_status = "failed"
+    stats_watch = None
+
+    encode_slot_held = False
+    try:
+        os.makedirs(save_dir, exist_ok=True)
+        stats_watch = asyncio.create_task(stats.watch(video_path))
+
+        # 📚 Finished VOD already recorded with the same window? Serve it by file_id
+        fingerprint = library.fingerprint_window(playlist, total_seconds, start_seconds) if config.LIBRARY_ENABLED else None
+        if fingerprint:
+            with stats.stage("library"):
+                doc = library.lookup(url, total_seconds, fingerprint, start_seconds, profile)
+            if doc:
+                caption = (
+                    f"File Name : {raw_filename or '@Toonix_India'}\n"
+                    f"Size : {doc.get('size', 0) / (1024 * 1024):.2f} MB\n"
+                    f"Duration : {TimeFormatter(doc.get('media_duration', total_seconds) * 1000)}\n"
+                    f"Date : {formatted_date}\n\n"
+                    "Credits By @Toonix_India"
+                )
+                try:
+                    with stats.stage("upload"):
+                        await library.send_from_library(
+                            bot, message.chat.id, doc, caption, reply_to_message_id=message_key(message)[1]
+                        )
+                    stats_status = "library"
+                    await status.done()
+                    return
+                except Exception as e:
+                    LOG.warning(f"[Library] Cached copy unusable, recording again: {e}")
+
+        # Bitrates are planned for what will actually be recorded: a finished VOD may end before the window does
+        planned_seconds = (
+            max(1, min(total_seconds, int(playlist.duration - start_seconds)))
+            if playlist and playlist.is_vod else total_seconds
+        )
+        codec_args = profiles.codec_args(profile, planned_seconds, audio_only)
+        # Decoding only keyframes is fine for the thumbnails but not when re-encoding the video
+        skip_frame = "-skip_frame nokey " if profile == "copy" and not audio_only else ""
+        if profile != "copy" and not profiles.is_audio_only(profile):
+            # 🎚 CPU budget: only ENCODE_SLOTS encodes run at once, each capped at ENCODE_THREADS
+            if encode_slots.locked():
+                status.edit(f"⏳ Waiting for a free encoder slot ({profile})...")
+            if not draining:
+                with stats.stage("encode_wait"):
+                    await encode_slots.acquire()
+                encode_slot_held = True
+            # A drain that began while waiting would stop a full-length encode right after it starts
+            if draining or task_entry.get("stop_early"):
+                return await status.fail(DRAIN_TEXT)
+
+        if config.VOD_MODE and playlist and playlist.downloadable:
+            # ⚡ Finished playlist: fetch the segments in parallel instead of recording in real time
+            segments = playlist.window(start_seconds, total_seconds)
+
+            async def on_segment(done, total, size):
+                stats.ingest_bytes = size
+                await vod_progress(status, done, total, size)
+
+            download = asyncio.create_task(vod.download(playlist, segments, save_dir, progress=on_segment))
+            task_entry["job"] = download
+            # wait() instead of await so a cancel from /cancel doesn't cancel the handler itself
+            with stats.stage("download"):
+                await asyncio.wait({download})
+            if download.cancelled():
+                raise Exception("Recording cancelled")
+            source = download.result()
+            if not audio_only and not await has_video(source):
+                audio_only = True
+                skip_frame = ""
+                video_path, container_args, codec_args = audio_variant(task_entry, profile, planned_seconds)
+                if encode_slot_held:
+                    # Audio is cheap to encode; let a waiting video job have the slot
+                    encode_slots.release()
+                    encode_slot_held = False
+            # Only the covering segments were fetched; trim the rest at keyframes without re-encoding
+            offset = max(0.0, start_seconds - segments[0].start) if segments else 0
+            if audio_only:
+                maps, vod_codec_args, extra_output = "-map 0:a", codec_args, ""
+            else:
+                maps = "-map 0:v -map 0:a?"
+                vod_codec_args = "-c copy" if profile == "copy" else codec_args
+                extra_output = thumbnail_output(save_dir, total_seconds)
+            ffmpeg_cmd = (
+                f'ffmpeg -y -benchmark {skip_frame}-ss {offset:.3f} -i "{source}" {maps} {vod_codec_args} -t {total_seconds} '
+                f'-metadata title="ToonEncodes" {container_args}"{video_path}" {extra_output}'
+            )
+            with stats.stage("remux"):
+                retcode, out, err = await runcmd(ffmpeg_cmd, task_entry)
+            # Reads the local copy of bytes already counted by the download: CPU only
+            stats.add_ffmpeg(err)
+            os.remove(source)
+            # Drain mode stopped the remux/encode with SIGINT: ffmpeg finalized what it wrote, deliver that
+            if retcode != 0 and task_entry.get("stop_early"):
+                if not (os.path.exists(video_path) and os.path.getsize(video_path) > 0):
+                    raise Exception("Stopped before any data was recorded")
+            elif retcode != 0:
+                raise Exception(f"FFmpeg error:\n{err}")
         else:
-            rand_sec = 1
-        thumb_path = os.path.join(save_dir, "thumb.jpg")
-        thumb_cmd = f'ffmpeg -y -ss {rand_sec} -i "{video_path}" -vframes 1 -q:v 2 "{thumb_path}"'
-        retcode, out, err = await runcmd(thumb_cmd)
-        if retcode != 0:
-            LOG.warning(f"Thumbnail generation failed: {err}")
+            # Title metadata and container flags are written in this pass, so no remux afterwards
+            async def record(maps, extra_output):
+                await ingest.record_stream(
+                    url, video_path, total_seconds, start_seconds, codec_args, skip_frame,
+                    container_args, extra_output, task_entry,
+                    is_active=lambda: task_id in user_tasks, maps=maps,
+                    seekable=bool(playlist and playlist.is_vod)
+                )
+
+            with stats.stage("record"):
+                if audio_only:
+                    await record("-map 0:a", "")
+                else:
+                    try:
+                        await record(ingest.VIDEO_MAPS, thumbnail_output(save_dir, total_seconds))
+                    except ingest.NoVideoStream:
+                        LOG.info(f"[Audio] {url} has no video, recording audio only")
+                        audio_only = True
+                        skip_frame = ""
+                        video_path, container_args, codec_args = audio_variant(task_entry, profile, planned_seconds)
+                        if encode_slot_held:
+                            encode_slots.release()
+                            encode_slot_held = False
+                        await record("-map 0:a", "")
+
+        dur, width, height = await probe_video(video_path)
+        # 🖼 Candidates were captured by the recording ffmpeg; only decode again if none came out
+        thumb_path = pick_thumbnail(save_dir) or os.path.join(save_dir, "thumb.jpg")
+        if not audio_only and not os.path.exists(thumb_path):
+            if dur > 10:
+                rand_sec = random.randint(5, dur - 5)
+            else:
+                rand_sec = 1
+            thumb_cmd = f'ffmpeg -y -benchmark -ss {rand_sec} -i "{video_path}" -vframes 1 -vf scale=320:-2 -q:v 2 "{thumb_path}"'
+            retcode, out, err = await runcmd(thumb_cmd)
+            stats.add_ffmpeg(err)
+            if retcode != 0:
+                LOG.warning(f"Thumbnail generation failed: {err}")
 
         display_name = raw_filename.strip() if raw_filename.strip() else "@Toonix_India"
 
@@ -796,34 +1362,37 @@ async def handle_record(bot, message):
             "Credits By @Toonix_India"
         )
 
-        start_unix = time.time()
-        await message.reply_video(
-            video=video_path,
-            caption=caption,
-            thumb=thumb_path if os.path.exists(thumb_path) else None,
-            progress=progress_for_pyrogram,
-            progress_args=(message, start_unix)
+        store_caption = (
+            f"📥 **Stored Recording**\n"
+            f"👤 User: @{message.from_user.username or message.from_user.first_name}\n"
+            f"📁 File: `{display_name}`\n"
+            f"📅 Date: {formatted_date}\n"
+            f"⏱ Time: {start_time.strftime('%I:%M:%S %p')} to {end_time.strftime('%I:%M:%S %p')}"
         )
 
-        # ✅ Also store the video in STORE_CHANNEL
-        try:
-            store_caption = (
-                f"📥 **Stored Recording**\n"
-                f"👤 User: @{message.from_user.username or message.from_user.first_name}\n"
-                f"📁 File: `{display_name}`\n"
-                f"📅 Date: {formatted_date}\n"
-                f"⏱ Time: {start_time.strftime('%I:%M:%S %p')} to {end_time.strftime('%I:%M:%S %p')}"
+        with stats.stage("upload"):
+            sent, store_id = await deliver_recording(
+                bot, message, status, video_path,
+                thumb_path if os.path.exists(thumb_path) else None,
+                caption, store_caption, dur, width, height, audio=audio_only
             )
-            await rvbot.send_video(
-                chat_id=config.STORE_CHANNEL_ID,
-                video=video_path,
-                caption=store_caption,
-                thumb=thumb_path if os.path.exists(thumb_path) else None
-            )
-        except Exception as e:
-            LOG.warning(f"[Store] Failed to send to store channel: {e}")
+        stats_status = "ok"
+
+        media = sent and (sent.video or sent.document or sent.audio)
+        # Only a complete recording may answer later identical requests; drain
+        # stops and watchdog partials are delivered but never indexed
+        expected = min(total_seconds, playlist.duration - start_seconds) if playlist else total_seconds
+        complete = not task_entry.get("stop_early") and dur + config.LIBRARY_DURATION_TOLERANCE >= expected
+        if fingerprint and media and complete:
+            try:
+                library.store(
+                    url, total_seconds, fingerprint, media.file_id, store_id, start=start_seconds, profile=profile,
+                    size=os.path.getsize(video_path), media_duration=dur
+                )
+            except Exception as e:
+                LOG.warning(f"[Library] Failed to index recording: {e}")
 
-        await msg.delete()
+        await status.done()
 
     except Exception as e:
         LOG.error("Error in handle_record:\n" + traceback.format_exc())
@@ -831,11 +1400,20 @@ async def handle_record(bot, message):
             err_text = str(e)
             if len(err_text) > 4000:
                 err_text = err_text[:4000] + "... [truncated]"
-            await msg.edit(f"❌ This URL is not supported for recording or has expired. Please try a different URL.")
+            await status.fail(f"❌ This URL is not supported for recording or has expired. Please try a different URL.")
         except Exception as exc:
             LOG.error(f"Failed to edit error message: {exc}")
 
     finally:
+        if stats_watch:
+            stats_watch.cancel()
+        if stats_status == "failed" and task_id not in user_tasks:
+            stats_status = "cancelled"
+        stats.save(stats_status, video_path if os.path.exists(video_path) else None)
+
+        last_update.pop(status.key, None)
+        if encode_slot_held:
+            encode_slots.release()
         if user_id in user_status:
             user_status[user_id] = [t for t in user_status[user_id] if t["id"] != task_id]
             if not user_status[user_id]:
@@ -850,16 +1428,172 @@ async def handle_record(bot, message):
             except Exception as cleanup_err:
                 LOG.warning(f"Cleanup failed: {cleanup_err}")
 
-async def runcmd(cmd: str) -> Tuple[int, str, str]:
+        async with task_finished:
+            task_finished.notify_all()
+
+async def deliver_recording(bot, message, status, video_path, thumb_path, caption, store_caption, dur, width=0, height=0,
+                            audio=False):
+    """Send the recording to the user and archive it in STORE_CHANNEL.
+
+    With helper sessions configured the file is uploaded once to the store
+    channel by the least busy helper and then sent to the user by file_id;
+    otherwise the main bot uploads it and the store copy reuses its file_id.
+    Audio-only recordings are small and always go through the main bot.
+    """
+    start_unix = time.time()
+    reply_to = message_key(message)[1]
+    video_args = dict(
+        thumb=thumb_path,
+        duration=dur,
+        width=width,
+        height=height,
+        supports_streaming=video_path.endswith(".mp4")
+    )
+
+    stored = None
+    if upload_pool.enabled() and not audio:
+        try:
+            stored = await upload_pool.upload_to_store(
+                video_path, store_caption,
+                **video_args,
+                progress=progress_for_pyrogram,
+                progress_args=(status, start_unix)
+            )
+        except Exception as e:
+            # The main bot remains the fallback
+            LOG.warning(f"[Pool] Helper upload failed, using the main bot: {e}")
+
+    if stored:
+        # file_ids are bound to the bot that saw the file, so re-read it as rvbot
+        store_id = message_key(stored)[1]
+        try:
+            own = await bot.get_messages(config.STORE_CHANNEL_ID, store_id)
+            media = own and (own.video or own.document)
+            if not media:
+                raise ValueError(f"store message {store_id} has no media")
+            sent = await bot.send_cached_media(
+                chat_id=message.chat.id,
+                file_id=media.file_id,
+                caption=caption,
+                reply_to_message_id=reply_to
+            )
+            return sent, store_id
+        except Exception as e:
+            # The file is in STORE_CHANNEL but unusable by this bot: upload it again
+            LOG.warning(f"[Pool] Helper upload not reusable, using the main bot: {e}")
+
+    if audio:
+        sent = await bot.send_audio(
+            chat_id=message.chat.id,
+            audio=video_path,
+            caption=caption,
+            duration=dur,
+            reply_to_message_id=reply_to,
+            progress=progress_for_pyrogram,
+            progress_args=(status, start_unix)
+        )
+    else:
+        sent = await uploader.send_video(
+            bot,
+            chat_id=message.chat.id,
+            video=video_path,
+            caption=caption,
+            **video_args,
+            reply_to_message_id=reply_to,
+            progress=progress_for_pyrogram,
+            progress_args=(status, start_unix)
+        )
+
+    # ✅ Also store the video in STORE_CHANNEL
+    stored = None
+    try:
+        media = sent and (sent.video or sent.document or sent.audio)
+        if media:
+            # Reuse the file just uploaded instead of sending the parts again
+            stored = await bot.send_cached_media(
+                chat_id=config.STORE_CHANNEL_ID,
+                file_id=media.file_id,
+                caption=store_caption
+            )
+        elif not audio:
+            stored = await bot.send_video(
+                chat_id=config.STORE_CHANNEL_ID,
+                video=video_path,
+                caption=store_caption,
+                **video_args
+            )
+    except Exception as e:
+        LOG.warning(f"[Store] Failed to send to store channel: {e}")
+    return sent, message_key(stored)[1] if stored else None
+
+def audio_variant(task_entry: dict, profile: str, seconds: int):
+    """Point a task at an audio-only output once its source turned out to have no video.
+
+    Returns the new (output path, container args, codec args).
+    """
+    path = f"{os.path.splitext(task_entry['output'])[0]}.{AUDIO_FORMAT[0]}"
+    task_entry.update(output=path, audio=True)
+    return path, AUDIO_FORMAT[1], profiles.codec_args(profile, seconds, audio_only=True)
+
+def thumbnail_output(save_dir: str, seconds: int) -> str:
+    """Extra ffmpeg output writing a few small keyframe stills next to the recording.
+
+    Paired with `-skip_frame nokey` on the input, only keyframes are decoded,
+    so the stills cost almost nothing on top of the stream copy.
+    """
+    thumbs_dir = os.path.join(save_dir, "thumbs")
+    os.makedirs(thumbs_dir, exist_ok=True)
+    interval = max(5, seconds // config.THUMB_CANDIDATES)
+    return (
+        f'-map 0:v:0 -vf "fps=1/{interval},scale=320:-2" -q:v 3 '
+        f'-frames:v {config.THUMB_CANDIDATES} -t {seconds} "{thumbs_dir}/%03d.jpg"'
+    )
+
+def pick_thumbnail(save_dir: str):
+    thumbs_dir = os.path.join(save_dir, "thumbs")
+    if not os.path.isdir(thumbs_dir):
+        return None
+    candidates = [os.path.join(thumbs_dir, f) for f in os.listdir(thumbs_dir)]
+    # Largest JPEG ≈ most detail; skips black/fade frames without decoding anything
+    candidates = [c for c in candidates if os.path.getsize(c) > 0]
+    return max(candidates, key=os.path.getsize) if candidates else None
+
+async def runcmd(cmd: str, task_entry: dict = None) -> Tuple[int, str, str]:
     args = shlex.split(cmd)
     process = await asyncio.create_subprocess_exec(
         *args,
         stdout=asyncio.subprocess.PIPE,
         stderr=asyncio.subprocess.PIPE
     )
+    if task_entry is not None:
+        # Lets /cancel and drain mode stop it
+        task_entry["process"] = process
     stdout, stderr = await process.communicate()
     return process.returncode, stdout.decode(), stderr.decode()
 
+async def has_video(input_file: str) -> bool:
+    cmd = f'ffprobe -v error -select_streams v -show_entries stream=index -of csv=p=0 "{input_file}"'
+    retcode, out, err = await runcmd(cmd)
+    # When ffprobe itself fails keep the normal video path
+    return retcode != 0 or bool(out.strip())
+
+async def probe_video(input_file: str) -> Tuple[int, int, int]:
+    """Duration, width and height via ffprobe (hachoir can't read fragmented MP4)."""
+    cmd = (
+        f'ffprobe -v error -select_streams v:0 -show_entries stream=width,height:format=duration '
+        f'-of json "{input_file}"'
+    )
+    retcode, out, err = await runcmd(cmd)
+    if retcode != 0:
+        LOG.warning(f"ffprobe failed, falling back to hachoir: {err}")
+        return await get_video_duration(input_file), 0, 0
+    info = json.loads(out or "{}")
+    stream = (info.get("streams") or [{}])[0]
+    duration = float(info.get("format", {}).get("duration") or 0)
+    if not duration:
+        duration = await get_video_duration(input_file)
+    return int(duration), stream.get("width", 0), stream.get("height", 0)
+
 async def get_video_duration(input_file: str) -> int:
     parser = createParser(input_file)
     if not parser:
@@ -870,14 +1604,16 @@ async def get_video_duration(input_file: str) -> int:
     duration = metadata.get("duration")
     return int(duration.seconds)
 
-last_update = 0
+# Last progress edit per status message, so concurrent uploads don't throttle each other
+last_update = {}
 
-async def progress_for_pyrogram(current, total, message, start):
-    global last_update
+@profiler.timed
+async def progress_for_pyrogram(current, total, status, start):
+    key = status.key
     now = time.time()
-    if now - last_update < 5:
+    if now - last_update.get(key, 0) < config.PROGRESS_UPDATE_INTERVAL:
         return
-    last_update = now
+    last_update[key] = now
     diff = now - start
     if diff == 0:
         diff = 1
@@ -891,10 +1627,18 @@ async def progress_for_pyrogram(current, total, message, start):
         f"Elapsed: {elapsed}\n"
         f"ETA: {eta}"
     )
-    try:
-        await message.edit(text)
-    except Exception:
-        pass
+    status.edit(text)
+
+async def vod_progress(status, done, total, size):
+    key = status.key
+    now = time.time()
+    if done < total and now - last_update.get(key, 0) < config.PROGRESS_UPDATE_INTERVAL:
+        return
+    last_update[key] = now
+    status.edit(
+        f"⚡ Fetching VOD segments: {done}/{total}\n"
+        f"Downloaded: {size / (1024 * 1024):.2f} MB"
+    )
 
 def TimeFormatter(milliseconds: int) -> str:
     seconds, ms = divmod(milliseconds, 1000)
@@ -905,8 +1649,22 @@ def TimeFormatter(milliseconds: int) -> str:
 async def start_bot():
     await rvbot.start()
     LOG.info("rvbot started")
+    await upload_pool.start()
+    if ENABLE_SHORTLINK and config.VERIFY_POOL_SIZE > 0:
+        asyncio.create_task(fill_verification_pool(rvbot))
+    asyncio.create_task(scheduler.run(prewarm_scheduled, dispatch_scheduled))
+
+async def main():
+    await start_bot()
+    loop = asyncio.get_running_loop()
+    # SIGTERM (redeploy) drains gracefully, Ctrl+C stops right away
+    loop.add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(drain("SIGTERM")))
+    loop.add_signal_handler(signal.SIGINT, shutdown.set)
+    await shutdown.wait()
+    await upload_pool.stop()
+    await rvbot.stop()
 
 
 if __name__ == "__main__":
     LOG.info("🚀 Starting Recorder Bot...")
-    rvbot.run()
+    asyncio.get_event_loop().run_until_complete(main())
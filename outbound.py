@@ -0,0 +1,214 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+
+from pyrogram import Client
+from pyrogram.errors import FloodWait, MessageNotModified
+
+import config
+
+LOG = logging.getLogger(__name__)
+
+TELEGRAM_TEXT_LIMIT = 4096
+
+
+def flood_wait_seconds(err: FloodWait) -> int:
+    # pyrogram 1.x exposes the wait as `x`, 2.x as `value`
+    return int(getattr(err, "value", None) or getattr(err, "x", 0) or 1)
+
+
+def message_key(message):
+    return message.chat.id, getattr(message, "id", None) or message.message_id
+
+
+class _Job:
+    __slots__ = ("factory", "future")
+
+    def __init__(self, factory, future=None):
+        self.factory = factory
+        self.future = future
+
+
+class OutboundScheduler:
+    """Single funnel for outbound sends/edits of one client.
+
+    Every chat gets its own FIFO drained by one worker, paced to Telegram's
+    per-chat limits and a global request rate. Edits of the same message are
+    coalesced (only the newest text is sent), group notifications are batched
+    into digests and FloodWait pauses the affected chat instead of dropping
+    the request.
+    """
+
+    def __init__(self, client: Client):
+        self.client = client
+        self._queues = {}
+        self._workers = {}
+        self._next_allowed = {}
+        self._global_next = 0.0
+        self._global_lock = asyncio.Lock()
+        self._digests = {}
+        self._digest_tasks = {}
+
+    # -----------------------
+    # 📤 Public API
+    # -----------------------
+    async def send(self, chat_id: int, text: str, **kwargs):
+        """Queue a send_message and wait for the resulting Message."""
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(chat_id, object(), _Job(
+            lambda: self.client.send_message(chat_id, text, **kwargs), future
+        ))
+        return await future
+
+    async def reply(self, message, text: str, **kwargs):
+        """send() in the message's chat, replying to it."""
+        chat_id, message_id = message_key(message)
+        return await self.send(chat_id, text, reply_to_message_id=message_id, **kwargs)
+
+    async def call(self, chat_id: int, factory):
+        """Queue an arbitrary API call (send_video, delete ...) for `chat_id`."""
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(chat_id, object(), _Job(factory, future))
+        return await future
+
+    def edit(self, message, text: str, **kwargs):
+        """Fire-and-forget edit; a pending edit of the same message is replaced."""
+        chat_id, message_id = message_key(message)
+        self._enqueue(chat_id, ("edit", message_id), _Job(
+            lambda: self.client.edit_message_text(chat_id, message_id, text, **kwargs)
+        ))
+
+    async def finish(self, message, text: str, **kwargs):
+        """Final edit of a status message: supersedes a pending edit and runs after one in flight."""
+        chat_id, message_id = message_key(message)
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(chat_id, ("edit", message_id), _Job(
+            lambda: self.client.edit_message_text(chat_id, message_id, text, **kwargs), future
+        ))
+        return await future
+
+    async def delete(self, message):
+        """Delete a status message once any in-flight edit of it is done."""
+        chat_id, message_id = message_key(message)
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(chat_id, ("edit", message_id), _Job(
+            lambda: self.client.delete_messages(chat_id, message_id), future
+        ))
+        return await future
+
+    def notify(self, chat_id: int, line: str):
+        """Add a line to the chat's digest, flushed every NOTIFY_DIGEST_SECONDS."""
+        if config.NOTIFY_DIGEST_SECONDS <= 0:
+            self._enqueue(chat_id, object(), _Job(
+                lambda: self.client.send_message(chat_id, line)
+            ))
+            return
+        self._digests.setdefault(chat_id, []).append(line)
+        if chat_id not in self._digest_tasks:
+            self._digest_tasks[chat_id] = asyncio.create_task(self._flush_digest_later(chat_id))
+
+    # -----------------------
+    # ⚙️ Internals
+    # -----------------------
+    def _enqueue(self, chat_id, key, job):
+        queue = self._queues.setdefault(chat_id, OrderedDict())
+        replaced = queue.get(key)
+        if replaced and replaced.future and not replaced.future.done():
+            replaced.future.set_result(None)
+        # Replacing keeps the original position so coalesced edits stay in order
+        queue[key] = job
+        if chat_id not in self._workers:
+            self._workers[chat_id] = asyncio.create_task(self._drain(chat_id))
+
+    def _chat_interval(self, chat_id: int) -> float:
+        if chat_id < 0:
+            return config.OUTBOUND_GROUP_INTERVAL
+        return config.OUTBOUND_PRIVATE_INTERVAL
+
+    async def _wait_global_slot(self):
+        if config.OUTBOUND_GLOBAL_RATE <= 0:
+            return
+        async with self._global_lock:
+            now = time.monotonic()
+            delay = self._global_next - now
+            if delay > 0:
+                await asyncio.sleep(delay)
+                now = time.monotonic()
+            self._global_next = now + 1 / config.OUTBOUND_GLOBAL_RATE
+
+    async def _drain(self, chat_id: int):
+        queue = self._queues[chat_id]
+        try:
+            while queue:
+                delay = self._next_allowed.get(chat_id, 0) - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if not queue:
+                    break
+
+                key, job = queue.popitem(last=False)
+                await self._wait_global_slot()
+                try:
+                    result = await job.factory()
+                except FloodWait as e:
+                    wait = flood_wait_seconds(e)
+                    LOG.warning(f"[Outbound] FloodWait {wait}s in chat {chat_id}")
+                    self._next_allowed[chat_id] = time.monotonic() + wait
+                    # Retry at the head unless a newer edit already replaced it
+                    if key not in queue:
+                        queue[key] = job
+                        queue.move_to_end(key, last=False)
+                    continue
+                except MessageNotModified:
+                    result = None
+                    if job.future and not job.future.done():
+                        job.future.set_result(None)
+                except Exception as e:
+                    if job.future and not job.future.done():
+                        job.future.set_exception(e)
+                    else:
+                        LOG.warning(f"[Outbound] Request to {chat_id} failed: {e}")
+                    result = None
+                else:
+                    if job.future and not job.future.done():
+                        job.future.set_result(result)
+
+                self._next_allowed[chat_id] = time.monotonic() + self._chat_interval(chat_id)
+        finally:
+            self._workers.pop(chat_id, None)
+            if not queue:
+                self._queues.pop(chat_id, None)
+                self._next_allowed.pop(chat_id, None)
+
+    async def _flush_digest_later(self, chat_id: int):
+        try:
+            await asyncio.sleep(config.NOTIFY_DIGEST_SECONDS)
+        finally:
+            self._digest_tasks.pop(chat_id, None)
+            lines = self._digests.pop(chat_id, [])
+            for text in _pack_lines(lines):
+                self._enqueue(chat_id, object(), _Job(
+                    lambda text=text: self.client.send_message(chat_id, text)
+                ))
+
+
+def _pack_lines(lines):
+    chunk = ""
+    for line in lines:
+        if chunk and len(chunk) + len(line) + 1 > TELEGRAM_TEXT_LIMIT:
+            yield chunk
+            chunk = ""
+        chunk = f"{chunk}\n{line}" if chunk else line[:TELEGRAM_TEXT_LIMIT]
+    if chunk:
+        yield chunk
+
+
+_schedulers = {}
+
+
+def for_client(client: Client) -> OutboundScheduler:
+    scheduler = _schedulers.get(id(client))
+    if scheduler is None:
+        scheduler = _schedulers[id(client)] = OutboundScheduler(client)
+    return scheduler
@@ -0,0 +1,71 @@
+import time
+import logging
+from urllib.parse import urlsplit
+
+import config
+from verify import db
+
+LOG = logging.getLogger(__name__)
+
+# (probesize, analyzeduration) pairs handed to ffmpeg
+FAST = (500000, 1000000)
+SAFE = (10000000, 15000000)
+
+# -----------------------
+# 🧭 Per-host probe hints
+# -----------------------
+probe_hints = db["probe_hints"]
+_hints = {}
+
+# Markers in ffmpeg's log meaning the probe window was too small to see every stream
+PROBE_TROUBLE = ("Could not find codec parameters", "unspecified size", "Stream map '0:a' matches no streams")
+
+
+def host_of(url: str) -> str:
+    return (urlsplit(url).hostname or "").lower()
+
+
+def _hint(host: str) -> dict:
+    hint = _hints.get(host)
+    if hint is None:
+        hint = probe_hints.find_one({"_id": host}) or {"_id": host, "ok": 0, "fail": 0, "safe_until": 0}
+        _hints[host] = hint
+    return hint
+
+
+def choose(url: str):
+    """Small probe values for hosts with a clean history, the large defaults otherwise."""
+    if not config.ADAPTIVE_PROBE:
+        return SAFE
+    hint = _hint(host_of(url))
+    if hint["ok"] >= config.PROBE_TRUST_AFTER and hint["safe_until"] < time.time():
+        return FAST
+    return SAFE
+
+
+def record(url: str, values, ok: bool, stderr: str = "", latency: float = None):
+    host = host_of(url)
+    hint = _hint(host)
+    clean = ok and not any(marker in stderr for marker in PROBE_TROUBLE)
+
+    if clean:
+        hint["ok"] += 1
+    else:
+        hint["fail"] += 1
+        hint["ok"] = 0
+        if values == FAST:
+            # Fast probing broke this host: keep it on the safe values for a while
+            hint["safe_until"] = time.time() + config.PROBE_PENALTY_SECONDS
+
+    latency_text = f"{latency:.2f}s" if latency is not None else "n/a"
+    LOG.info(
+        f"[Probe] {host}: probesize={values[0]} analyzeduration={values[1]} "
+        f"start_latency={latency_text} clean={clean}"
+    )
+    probe_hints.update_one(
+        {"_id": host},
+        {"$set": {"ok": hint["ok"], "fail": hint["fail"], "safe_until": hint["safe_until"],
+                  "last_latency": latency}},
+        upsert=True,
+    )
+
@@ -0,0 +1,167 @@
+import io
+import os
+import re
+import sys
+import time
+import pstats
+import asyncio
+import cProfile
+import logging
+import threading
+import functools
+from collections import Counter, defaultdict
+
+SAMPLE_INTERVAL = 0.01
+LAG_INTERVAL = 0.05
+SLOW_CALLBACK_SECONDS = 0.1
+# asyncio debug log: "Executing <Task ... coro=<name() running at ...>> took 0.150 seconds"
+SLOW_RE = re.compile(r"(?:coro=<|<Handle |<TimerHandle )(\S+?)\(.*took ([\d.]+) seconds", re.S)
+
+# The running Session while /profile samples, None otherwise
+active = None
+
+
+class Session:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.handler_times = defaultdict(list)
+        self.lags = []
+        self.slow_callbacks = []
+        self.folded = Counter()
+
+
+def timed(func):
+    """Record a coroutine's wall time while a profile is running; one check otherwise."""
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if active is None:
+            return await func(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            session = active
+            if session is not None:
+                session.handler_times[name].append(time.perf_counter() - started)
+    return wrapper
+
+
+class _SlowCallbackHandler(logging.Handler):
+    def __init__(self, session: Session):
+        super().__init__(logging.WARNING)
+        self.session = session
+
+    def emit(self, record):
+        match = SLOW_RE.search(record.getMessage())
+        if match:
+            self.session.slow_callbacks.append((match.group(1), float(match.group(2))))
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack_sampler(session: Session, thread_id: int, stop: threading.Event):
+    while not stop.wait(SAMPLE_INTERVAL):
+        frame = sys._current_frames().get(thread_id)
+        stack = []
+        while frame is not None:
+            stack.append(_frame_name(frame))
+            frame = frame.f_back
+        if stack:
+            session.folded[";".join(reversed(stack))] += 1
+
+
+async def _lag_monitor(session: Session):
+    while True:
+        expected = time.monotonic() + LAG_INTERVAL
+        await asyncio.sleep(LAG_INTERVAL)
+        session.lags.append(max(0.0, time.monotonic() - expected))
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def sample(seconds: int, folded_path: str) -> str:
+    """Profile the running event loop for `seconds`.
+
+    Returns a text report and writes folded stacks (flamegraph.pl /
+    speedscope format) to `folded_path`.
+    """
+    global active
+    if active is not None:
+        raise RuntimeError("A profile is already running")
+
+    loop = asyncio.get_running_loop()
+    session = active = Session()
+    profile = cProfile.Profile()
+    stop = threading.Event()
+    sampler = threading.Thread(target=_stack_sampler, args=(session, threading.get_ident(), stop), daemon=True)
+    slow_handler = _SlowCallbackHandler(session)
+    asyncio_log = logging.getLogger("asyncio")
+    was_debug, was_threshold = loop.get_debug(), loop.slow_callback_duration
+
+    lag_task = asyncio.create_task(_lag_monitor(session))
+    asyncio_log.addHandler(slow_handler)
+    loop.set_debug(True)
+    loop.slow_callback_duration = SLOW_CALLBACK_SECONDS
+    sampler.start()
+    profile.enable()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profile.disable()
+        stop.set()
+        loop.set_debug(was_debug)
+        loop.slow_callback_duration = was_threshold
+        asyncio_log.removeHandler(slow_handler)
+        lag_task.cancel()
+        active = None
+    sampler.join()
+
+    with open(folded_path, "w") as f:
+        for stack, count in session.folded.most_common():
+            f.write(f"{stack} {count}\n")
+
+    return _report(session, profile, seconds)
+
+
+def _report(session: Session, profile: cProfile.Profile, seconds: int) -> str:
+    lines = [f"**🔬 Profile — {seconds}s**\n"]
+
+    lags = session.lags
+    lines.append(
+        f"**Loop lag:** p50 {_percentile(lags, 0.5) * 1000:.1f} ms, "
+        f"p99 {_percentile(lags, 0.99) * 1000:.1f} ms, max {max(lags, default=0) * 1000:.1f} ms"
+    )
+
+    lines.append("\n**Handlers (wall time):**")
+    if session.handler_times:
+        for name, times in sorted(session.handler_times.items(), key=lambda kv: -sum(kv[1])):
+            lines.append(
+                f"`{name}`: {len(times)} calls, total {sum(times):.2f}s, "
+                f"p50 {_percentile(times, 0.5) * 1000:.0f} ms, max {max(times) * 1000:.0f} ms"
+            )
+    else:
+        lines.append("—")
+
+    lines.append(f"\n**Slow callbacks (>{SLOW_CALLBACK_SECONDS * 1000:.0f} ms):** {len(session.slow_callbacks)}")
+    slow = defaultdict(list)
+    for name, took in session.slow_callbacks:
+        slow[name].append(took)
+    for name, times in sorted(slow.items(), key=lambda kv: -max(kv[1]))[:5]:
+        lines.append(f"• `{name}`: {len(times)}x, max {max(times) * 1000:.0f} ms")
+
+    out = io.StringIO()
+    stats = pstats.Stats(profile, stream=out)
+    stats.sort_stats("cumulative").print_stats(12)
+    top = [line for line in out.getvalue().splitlines() if line.strip()][-13:]
+    lines.append("\n**Top functions (cumulative):**\n```\n" + "\n".join(top) + "\n```")
+    return "\n".join(lines)
@@ -0,0 +1,89 @@
+import config
+
+# -----------------------
+# 🎚 Encoding profiles
+# -----------------------
+# height: output height (keeps aspect), video_kbps: target video bitrate,
+# max_bytes: hard size cap the bitrate is planned against,
+# audio_only: drop the video (radio / podcast streams)
+PROFILES = {
+    "copy": {},
+    "1080p": {"height": 1080, "video_kbps": 4000},
+    "720p": {"height": 720, "video_kbps": 1500},
+    "480p": {"height": 480, "video_kbps": 800, "audio_kbps": 96},
+    "360p": {"height": 360, "video_kbps": 450, "audio_kbps": 64},
+    "2gb": {"max_bytes": 2000 * 1024 * 1024},
+    "1gb": {"max_bytes": 1000 * 1024 * 1024},
+    "500mb": {"max_bytes": 500 * 1024 * 1024},
+    "audio": {"audio_only": True},
+    "audio64": {"audio_only": True, "audio_kbps": 64},
+}
+
+MIN_VIDEO_KBPS = 150
+
+
+def resolve(name: str, user_id: int) -> str:
+    if name and name.lower() in PROFILES:
+        return name.lower()
+    if user_id in config.AUTH_USERS:
+        return config.DEFAULT_PROFILE
+    return config.FREE_USER_PROFILE
+
+
+def _budget_kbps(profile: dict, seconds: int):
+    """(video kbps the size cap leaves over `seconds`, audio kbps)."""
+    audio_kbps = profile.get("audio_kbps", 128)
+    max_bytes = min(profile.get("max_bytes", config.TELEGRAM_MAX_BYTES), config.TELEGRAM_MAX_BYTES)
+    # 5% headroom for container overhead and rate-control overshoot
+    return int(max_bytes * 8 * 0.95 / max(seconds, 1) / 1000) - audio_kbps, audio_kbps
+
+
+def plan_bitrate(profile: dict, seconds: int):
+    """Video kbps that keeps `seconds` of output under the profile's (or Telegram's) size cap."""
+    budget_kbps, audio_kbps = _budget_kbps(profile, seconds)
+    video_kbps = min(profile.get("video_kbps", budget_kbps), budget_kbps)
+    # Never above the budget; requests that can't get MIN_VIDEO_KBPS are refused by size_error
+    return max(video_kbps, 1), audio_kbps
+
+
+def size_error(name: str, seconds: int):
+    """Reason `seconds` of the `name` profile can't fit its size cap at MIN_VIDEO_KBPS, or None."""
+    profile = PROFILES[name]
+    if not profile or profile.get("audio_only"):
+        return None
+    budget_kbps, audio_kbps = _budget_kbps(profile, seconds)
+    if budget_kbps >= MIN_VIDEO_KBPS:
+        return None
+    max_bytes = min(profile.get("max_bytes", config.TELEGRAM_MAX_BYTES), config.TELEGRAM_MAX_BYTES)
+    longest = int(max_bytes * 8 * 0.95 / 1000 / (MIN_VIDEO_KBPS + audio_kbps))
+    return (
+        f"❌ #{name} can't fit this duration in {max_bytes // (1024 * 1024)} MB.\n"
+        f"Record at most {longest // 3600:02}:{longest % 3600 // 60:02}:{longest % 60:02} per link."
+    )
+
+
+def is_audio_only(name: str) -> bool:
+    return PROFILES[name].get("audio_only", False)
+
+
+def codec_args(name: str, seconds: int, audio_only: bool = False) -> str:
+    """ffmpeg codec options for `name`; stream copy for the "copy" profile.
+
+    With `audio_only` (or an audio profile) the video is dropped and the audio
+    is copied, or encoded when the profile sets an audio bitrate.
+    """
+    profile = PROFILES[name]
+    if audio_only or profile.get("audio_only"):
+        if "audio_kbps" in profile:
+            return f"-vn -c:a aac -b:a {profile['audio_kbps']}k"
+        return "-vn -c:a copy"
+    if not profile:
+        return "-c:v copy -c:a aac"
+
+    video_kbps, audio_kbps = plan_bitrate(profile, seconds)
+    scale = f'-vf "scale=-2:\'min({profile["height"]},ih)\'" ' if profile.get("height") else ""
+    return (
+        f"-c:v libx264 -preset {config.ENCODE_PRESET} -threads {config.ENCODE_THREADS} "
+        f"-b:v {video_kbps}k -maxrate {video_kbps}k -bufsize {video_kbps * 2}k {scale}"
+        f"-c:a aac -b:a {audio_kbps}k"
+    )
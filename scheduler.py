@@ -0,0 +1,221 @@
+import os
+import time
+import uuid
+import socket
+import asyncio
+import logging
+
+from bson import ObjectId
+from pymongo import ASCENDING
+
+import config
+from verify import db
+
+LOG = logging.getLogger(__name__)
+
+# -----------------------
+# ⏰ Persistent schedule
+# -----------------------
+schedules = db["schedules"]
+schedules.create_index([("status", ASCENDING), ("run_at", ASCENDING)])
+schedules.create_index([("user_id", ASCENDING), ("status", ASCENDING)])
+
+
+class TimerWheel:
+    """Hashed timing wheel with one-second ticks.
+
+    Insert and cancel are O(1) and each tick only touches one slot, so
+    thousands of pending entries cost nothing between their deadlines.
+    """
+
+    def __init__(self, slots: int = 3600):
+        self.slots = [dict() for _ in range(slots)]
+        self.tick = int(time.time())
+        self._where = {}
+
+    def add(self, key, when: float, item):
+        self.remove(key)
+        due = max(int(when), self.tick)
+        rounds = (due - self.tick) // len(self.slots)
+        index = due % len(self.slots)
+        self.slots[index][key] = [rounds, item]
+        self._where[key] = index
+
+    def __contains__(self, key):
+        return key in self._where
+
+    def remove(self, key):
+        index = self._where.pop(key, None)
+        if index is not None:
+            self.slots[index].pop(key, None)
+
+    def advance(self, now: float):
+        """Yield items whose deadline passed since the previous call."""
+        while self.tick <= int(now):
+            slot = self.slots[self.tick % len(self.slots)]
+            for key in list(slot):
+                entry = slot[key]
+                if entry[0] > 0:
+                    entry[0] -= 1
+                    continue
+                del slot[key]
+                self._where.pop(key, None)
+                yield entry[1]
+            self.tick += 1
+
+
+SWEEP_SECONDS = 60
+# A claimed entry belongs to its instance until the lease runs out; the owner
+# renews it every sweep while the entry waits for a slot
+LEASE_SECONDS = 3 * SWEEP_SECONDS
+INSTANCE_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+wheel = TimerWheel()
+prewarmed = {}
+_launch_queue = asyncio.Queue()
+_held = set()
+
+
+def add(user_id: int, chat_id: int, message_id: int, text: str, run_at: float, username: str) -> str:
+    doc = {
+        "user_id": user_id,
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "text": text,
+        "run_at": run_at,
+        "username": username,
+        "status": "pending",
+        "created_at": int(time.time()),
+    }
+    schedule_id = str(schedules.insert_one(doc).inserted_id)
+    _arm(schedule_id, run_at)
+    return schedule_id
+
+
+def cancel(schedule_id: str, user_id: int = None) -> bool:
+    query = {"_id": ObjectId(schedule_id), "status": "pending"}
+    if user_id is not None:
+        query["user_id"] = user_id
+    if not schedules.update_one(query, {"$set": {"status": "cancelled"}}).modified_count:
+        return False
+    wheel.remove(("prewarm", schedule_id))
+    wheel.remove(("start", schedule_id))
+    prewarmed.pop(schedule_id, None)
+    return True
+
+
+def pending_for(user_id: int):
+    return list(schedules.find({"user_id": user_id, "status": "pending"}).sort("run_at", ASCENDING))
+
+
+def finish_claim(doc, status: str) -> bool:
+    """Move an entry this instance claimed out of "dispatched".
+
+    False if the claim was lost (lease expired and another instance took
+    the entry), in which case the caller must not act on it.
+    """
+    _held.discard(doc["_id"])
+    result = schedules.update_one(
+        {"_id": doc["_id"], "status": "dispatched", "owner": INSTANCE_ID},
+        {"$set": {"status": status}, "$unset": {"lease_until": ""}},
+    )
+    return bool(result.modified_count)
+
+
+def _renew():
+    if _held:
+        schedules.update_many(
+            {"_id": {"$in": list(_held)}, "status": "dispatched", "owner": INSTANCE_ID},
+            {"$set": {"lease_until": time.time() + LEASE_SECONDS}},
+        )
+
+
+def _arm(schedule_id: str, run_at: float):
+    wheel.add(("prewarm", schedule_id), run_at - config.SCHEDULE_PREWARM_SECONDS, ("prewarm", schedule_id))
+    wheel.add(("start", schedule_id), run_at, ("start", schedule_id))
+
+
+def load(startup: bool = False):
+    """Arm pending entries not yet in the wheel; ones missed by more than the grace window are dropped.
+
+    Runs at start and then every SWEEP_SECONDS, which picks up entries a
+    draining instance handed back and claims whose owner stopped renewing
+    them (it died before starting the recording).
+    """
+    now = time.time()
+    schedules.update_many(
+        {"status": "dispatched", "$or": [{"lease_until": {"$lt": now}}, {"lease_until": {"$exists": False}}]},
+        {"$set": {"status": "pending"}},
+    )
+    count = 0
+    for doc in schedules.find({"status": "pending"}):
+        schedule_id = str(doc["_id"])
+        if ("start", schedule_id) in wheel:
+            continue
+        if doc["run_at"] < now - config.SCHEDULE_MISSED_GRACE:
+            schedules.update_one({"_id": doc["_id"], "status": "pending"}, {"$set": {"status": "missed"}})
+            continue
+        _arm(schedule_id, doc["run_at"])
+        count += 1
+    if count or startup:
+        LOG.info(f"[Schedule] {count} pending recordings armed")
+
+
+async def run(prewarm, dispatch):
+    """Drive the wheel. `prewarm(doc)` runs shortly before start, `dispatch(doc)` at start.
+
+    Starts falling due together are fed through one queue at
+    SCHEDULE_STARTS_PER_SECOND so a popular show time doesn't spawn every
+    ffmpeg in the same instant.
+    """
+    load(startup=True)
+    last_sweep = time.time()
+    launcher = asyncio.create_task(_launcher(dispatch))
+    try:
+        while True:
+            for kind, schedule_id in wheel.advance(time.time()):
+                query = {"_id": ObjectId(schedule_id), "status": "pending"}
+                if kind == "prewarm":
+                    doc = schedules.find_one(query)
+                    if doc:
+                        asyncio.create_task(_safe(prewarm, doc))
+                    continue
+                # Atomic claim with an owner, so two instances never both start the same entry
+                doc = schedules.find_one_and_update(query, {"$set": {
+                    "status": "dispatched", "dispatched_at": time.time(),
+                    "owner": INSTANCE_ID, "lease_until": time.time() + LEASE_SECONDS,
+                }})
+                if doc:
+                    _held.add(doc["_id"])
+                    _launch_queue.put_nowait(doc)
+            if time.time() - last_sweep >= SWEEP_SECONDS:
+                _renew()
+                load()
+                last_sweep = time.time()
+            await asyncio.sleep(1 - time.time() % 1)
+    finally:
+        launcher.cancel()
+
+
+async def _launcher(dispatch):
+    interval = 1 / max(config.SCHEDULE_STARTS_PER_SECOND, 0.01)
+    while True:
+        doc = await _launch_queue.get()
+        asyncio.create_task(_dispatch(dispatch, doc))
+        await asyncio.sleep(interval)
+
+
+async def _dispatch(dispatch, doc):
+    try:
+        await _safe(dispatch, doc)
+    finally:
+        # dispatch() settles its claim on every normal path; this covers errors
+        if doc["_id"] in _held:
+            finish_claim(doc, "failed")
+
+
+async def _safe(func, doc):
+    try:
+        await func(doc)
+    except Exception as e:
+        LOG.warning(f"[Schedule] {func.__name__} failed for {doc['_id']}: {e}")
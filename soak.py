@@ -0,0 +1,344 @@
+"""Soak test: thousands of record / cancel / verify cycles through the real handlers.
+
+    MONGO_URI=mongodb://localhost:27017 python soak.py --cycles 5000
+
+Telegram is replaced by a stub client and the stream is a short HLS clip
+generated with ffmpeg and served from a local HTTP server, which also plays
+the shortlink API. Point MONGO_URI at a throwaway MongoDB: verifyDB is
+written to. Every --sample-every cycles RSS, live objects, open file
+descriptors, scratch folders and the module-level state (user_status,
+user_tasks, last_update, outbound queues) are recorded together with a
+tracemalloc snapshot. The run fails if any of them keeps growing after the
+warm-up, or if state or scratch folders are left behind at the end.
+"""
+import os
+import re
+import gc
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+import tracemalloc
+from types import SimpleNamespace
+from functools import partial
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+SOAK_USER_BASE = 9_000_000_000  # synthetic user ids, far from real ones
+SOAK_USERS = 50
+CANCELME_CONFIRM_RE = re.compile(r"^cancelme_confirm_(\d+)$")
+
+
+# -----------------------
+# 🎬 Local test stream + shortlink API
+# -----------------------
+def make_stream(root: str, seconds: int):
+    subprocess.run(
+        [
+            "ffmpeg", "-loglevel", "error", "-y",
+            "-f", "lavfi", "-i", "testsrc=size=320x180:rate=15",
+            "-f", "lavfi", "-i", "sine=frequency=440",
+            "-t", str(seconds), "-c:v", "libx264", "-preset", "ultrafast", "-g", "15",
+            "-c:a", "aac", "-f", "hls", "-hls_time", "2", "-hls_playlist_type", "vod",
+            os.path.join(root, "index.m3u8"),
+        ],
+        check=True,
+    )
+
+
+class _Handler(SimpleHTTPRequestHandler):
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        if parts.path != "/api":
+            return super().do_GET()
+        url = parse_qs(parts.query).get("url", [""])[0]
+        body = json.dumps({"status": "success", "shortenedUrl": url}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(root: str):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(_Handler, directory=root))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+# -----------------------
+# 🤖 Stub Telegram client
+# -----------------------
+class StubMessage:
+    _ids = 0
+
+    def __init__(self, client, chat, from_user=None, text="", video=None):
+        StubMessage._ids += 1
+        self._client = client
+        self.id = self.message_id = StubMessage._ids
+        self.chat = chat
+        self.from_user = from_user
+        self.text = text
+        self.command = text[1:].split() if text.startswith("/") else []
+        self.video = video
+        self.document = None
+
+    async def reply(self, text="", **kwargs):
+        return await self._client.send_message(self.chat.id, text)
+
+    reply_text = reply
+
+    async def reply_document(self, document, **kwargs):
+        return await self._client.send_message(self.chat.id, "")
+
+    async def edit(self, text, **kwargs):
+        return await self._client.edit_message_text(self.chat.id, self.id, text)
+
+    edit_text = edit
+
+    async def delete(self):
+        self._client.calls += 1
+
+
+class StubCallbackQuery:
+    def __init__(self, client, message, from_user, data, pattern):
+        self.message = message
+        self.from_user = from_user
+        self.data = data
+        self.matches = [pattern.match(data)]
+
+    async def answer(self, *args, **kwargs):
+        pass
+
+    async def edit_message_text(self, text, **kwargs):
+        return await self.message.edit(text)
+
+
+class StubClient:
+    """Answers every call the handlers make; keeps counters only, so it can't leak."""
+
+    def __init__(self):
+        self.calls = 0
+        self.bot_user = SimpleNamespace(id=1, username="soak_bot", first_name="Soak")
+
+    def _chat(self, chat_id):
+        return SimpleNamespace(id=chat_id, type="private" if chat_id > 0 else "supergroup")
+
+    async def get_me(self):
+        return self.bot_user
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.calls += 1
+        return StubMessage(self, self._chat(chat_id), self.bot_user, text)
+
+    async def edit_message_text(self, chat_id, message_id, text, **kwargs):
+        self.calls += 1
+        return StubMessage(self, self._chat(chat_id), self.bot_user, text)
+
+    async def send_video(self, chat_id, video, progress=None, progress_args=(), **kwargs):
+        self.calls += 1
+        size = os.path.getsize(video)
+        if progress:
+            await progress(size // 2, size, *progress_args)
+            await progress(size, size, *progress_args)
+        media = SimpleNamespace(file_id=f"soak-{StubMessage._ids}")
+        return StubMessage(self, self._chat(chat_id), self.bot_user, video=media)
+
+    async def send_cached_media(self, chat_id, file_id, **kwargs):
+        self.calls += 1
+        return StubMessage(self, self._chat(chat_id), self.bot_user, video=SimpleNamespace(file_id=file_id))
+
+    async def delete_messages(self, chat_id, message_ids, **kwargs):
+        self.calls += 1
+        return True
+
+    async def get_messages(self, chat_id, message_id):
+        return StubMessage(self, self._chat(chat_id), self.bot_user, video=SimpleNamespace(file_id="soak"))
+
+
+# -----------------------
+# 📏 Measurements
+# -----------------------
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def sample(app, scratch: str) -> dict:
+    gc.collect()
+    outbound = app.outbound
+    return {
+        "rss_mb": round(rss_mb(), 1),
+        "objects": len(gc.get_objects()),
+        "fds": len(os.listdir("/proc/self/fd")),
+        "scratch_dirs": len(os.listdir(scratch)),
+        "tasks": len(asyncio.all_tasks()),
+        "user_status": len(app.user_status),
+        "user_tasks": len(app.user_tasks),
+        "last_update": len(app.last_update),
+        "outbound": len(outbound._queues) + len(outbound._workers) + len(outbound._next_allowed),
+    }
+
+
+# Allowed growth between the first and last post-warm-up sample
+SLACK = {"rss_mb": 32, "objects": 5000, "fds": 4, "scratch_dirs": 0, "tasks": 4,
+         "user_status": 0, "user_tasks": 0, "last_update": 0, "outbound": 2}
+
+
+def growing(values, slack) -> bool:
+    """Grew past `slack` overall and the last third still sits above the first third."""
+    if len(values) < 3:
+        return False
+    third = max(1, len(values) // 3)
+    head = sum(values[:third]) / third
+    tail = sum(values[-third:]) / third
+    return values[-1] - values[0] > slack and tail > head
+
+
+# -----------------------
+# 🔁 Cycles
+# -----------------------
+async def verify_cycle(app, bot, user, group):
+    app.tokens.delete_one({"_id": user.id})
+    await app.verify_handler(bot, StubMessage(bot, group, user, "/verify"))
+    token = app.tokens.find_one({"_id": user.id})["token"]
+    await app.start(bot, StubMessage(bot, SimpleNamespace(id=user.id, type="private"), user, f"/start verify_{token}"))
+    assert app.is_user_verified(user.id), "verification did not stick"
+
+
+async def record_cycle(app, bot, user, chat, url):
+    await app.handle_record(bot, StubMessage(bot, chat, user, f"{url} 00:00:04 soak {random.randint(1, 99)}"))
+
+
+async def cancel_cycle(app, bot, user, chat, url):
+    before = set(app.user_tasks)
+    job = asyncio.create_task(record_cycle(app, bot, user, chat, url))
+    while not set(app.user_tasks) - before and not job.done():
+        await asyncio.sleep(0)
+    await asyncio.sleep(random.random() * 0.5)
+    for task_id in set(app.user_tasks) - before:
+        data = f"cancelme_confirm_{task_id}"
+        query = StubCallbackQuery(bot, StubMessage(bot, chat, bot.bot_user), user, data, CANCELME_CONFIRM_RE)
+        await app.cancelme_confirm(bot, query)
+    await job
+
+
+async def run(args, app, scratch, url):
+    bot = StubClient()
+    # Handlers reach Telegram through these module globals
+    app.rvbot = bot
+    app.outbound = app.for_client(bot)
+
+    group = SimpleNamespace(id=app.config.WORKING_GROUP, type="supergroup")
+    users = [SimpleNamespace(id=SOAK_USER_BASE + i, username=f"soak{i}", first_name="Soak") for i in range(SOAK_USERS)]
+
+    tracemalloc.start(10)
+    samples = []
+    baseline = None
+    started = time.time()
+
+    for cycle in range(1, args.cycles + 1):
+        user = users[cycle % len(users)]
+        # Alternate the parallel VOD path and the ffmpeg ingest path
+        app.config.VOD_MODE = cycle % 2 == 0
+        kind = ("verify", "record", "cancel")[cycle % 3]
+        if kind == "verify":
+            await verify_cycle(app, bot, user, group)
+        else:
+            if not app.is_user_verified(user.id):
+                await verify_cycle(app, bot, user, group)
+            cycle_func = record_cycle if kind == "record" else cancel_cycle
+            await cycle_func(app, bot, user, group, url)
+
+        if cycle % args.sample_every == 0:
+            # Let fire-and-forget edits drain before measuring
+            await asyncio.sleep(0.1)
+            row = sample(app, scratch)
+            row["cycle"] = cycle
+            samples.append(row)
+            print(f"[{time.time() - started:7.0f}s] " + " ".join(f"{k}={v}" for k, v in row.items()), flush=True)
+            if cycle >= args.warmup and baseline is None:
+                baseline = tracemalloc.take_snapshot()
+
+    await asyncio.sleep(1)
+    final = sample(app, scratch)
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    failures = []
+    steady = [row for row in samples if row["cycle"] >= args.warmup]
+    for metric, slack in SLACK.items():
+        if growing([row[metric] for row in steady], slack):
+            failures.append(f"{metric} keeps growing: {steady[0][metric]} -> {steady[-1][metric]}")
+    for metric in ("scratch_dirs", "user_status", "user_tasks", "last_update"):
+        if final[metric]:
+            failures.append(f"{metric} not empty after the run: {final[metric]}")
+
+    if baseline is not None:
+        print("\nTop allocation growth since warm-up:")
+        for stat in snapshot.compare_to(baseline, "traceback")[:10]:
+            print(f"  {stat.size_diff / 1024:+.1f} KiB {stat.count_diff:+d} blocks  {stat.traceback.format()[-1].strip()}")
+
+    print(f"\n{args.cycles} cycles, {bot.calls} Telegram calls, {time.time() - started:.0f}s")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK: no growth detected")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cycles", type=int, default=3000)
+    parser.add_argument("--sample-every", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=300, help="cycles ignored by the growth checks")
+    args = parser.parse_args()
+
+    if "MONGO_URI" not in os.environ:
+        sys.exit("Set MONGO_URI to a throwaway MongoDB; the soak test writes to verifyDB.")
+
+    work = tempfile.mkdtemp(prefix="soak_")
+    stream_dir = os.path.join(work, "stream")
+    scratch = os.path.join(work, "downloads")
+    os.makedirs(stream_dir)
+    os.makedirs(scratch)
+    make_stream(stream_dir, 12)
+    server, base_url = serve(stream_dir)
+
+    # Settings read at import time; no pacing, no helpers, every request records
+    os.environ.update({
+        "DOWNLOAD_DIRECTORY": scratch,
+        "SHORTLINK_URL": base_url,
+        "UPLOAD_WORKERS": "1",
+        "HELPER_BOT_TOKENS": "",
+        "LIBRARY_ENABLED": "false",
+        "OUTBOUND_GLOBAL_RATE": "0",
+        "OUTBOUND_PRIVATE_INTERVAL": "0",
+        "OUTBOUND_GROUP_INTERVAL": "0",
+        "NOTIFY_DIGEST_SECONDS": "0",
+        "PROGRESS_UPDATE_INTERVAL": "0",
+        "ACCOUNTING_SAMPLE_SECONDS": "0.5",
+        "USER_LIMIT_LINK": "0",
+        "LIMIT_LINK": "0",
+    })
+    import main as bot_main
+
+    try:
+        code = asyncio.get_event_loop().run_until_complete(run(args, bot_main, scratch, f"{base_url}/index.m3u8"))
+    finally:
+        server.shutdown()
+        shutil.rmtree(work, ignore_errors=True)
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
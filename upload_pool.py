@@ -0,0 +1,87 @@
+import time
+import asyncio
+import logging
+
+from pyrogram import Client
+from pyrogram.errors import FloodWait
+
+import config
+import uploader
+from outbound import flood_wait_seconds
+
+LOG = logging.getLogger(__name__)
+
+
+class Helper:
+    def __init__(self, index: int, token: str):
+        self.name = f"helper_{index}"
+        self.client = Client(
+            self.name, bot_token=token, api_id=config.API_ID, api_hash=config.API_HASH, in_memory=True
+        )
+        self.active = 0
+        self.flood_until = 0.0
+
+    @property
+    def flooded(self) -> bool:
+        return self.flood_until > time.monotonic()
+
+
+helpers = [Helper(i, token) for i, token in enumerate(config.HELPER_BOT_TOKENS, 1)]
+
+
+async def start():
+    for helper in helpers:
+        try:
+            await helper.client.start()
+            LOG.info(f"[Pool] {helper.name} started")
+        except Exception as e:
+            LOG.warning(f"[Pool] {helper.name} failed to start, leaving it out: {e}")
+            helper.flood_until = float("inf")
+
+
+async def stop():
+    for helper in helpers:
+        try:
+            await helper.client.stop()
+        except Exception:
+            pass
+
+
+def enabled() -> bool:
+    return any(h.flood_until != float("inf") for h in helpers)
+
+
+def _pick() -> Helper:
+    ready = [h for h in helpers if not h.flooded]
+    if ready:
+        return min(ready, key=lambda h: h.active)
+    return min(helpers, key=lambda h: h.flood_until)
+
+
+async def upload_to_store(video: str, caption: str, **kwargs):
+    """Upload `video` to STORE_CHANNEL_ID through the least busy helper session.
+
+    Returns the stored message as seen by the helper; the main bot then
+    delivers it to the user by file_id without uploading it again.
+    """
+    last_error = None
+    for _ in range(len(helpers) + 1):
+        helper = _pick()
+        wait = helper.flood_until - time.monotonic()
+        if wait > 0:
+            if wait == float("inf"):
+                break
+            await asyncio.sleep(wait)
+
+        helper.active += 1
+        try:
+            return await uploader.send_video(
+                helper.client, chat_id=config.STORE_CHANNEL_ID, video=video, caption=caption, **kwargs
+            )
+        except FloodWait as e:
+            helper.flood_until = time.monotonic() + flood_wait_seconds(e)
+            LOG.warning(f"[Pool] {helper.name} hit FloodWait, trying another session")
+            last_error = e
+        finally:
+            helper.active -= 1
+    raise last_error or RuntimeError("No helper session available")
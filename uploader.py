@@ -0,0 +1,182 @@
+import os
+import time
+import asyncio
+import logging
+import mimetypes
+
+from pyrogram import Client, raw, types, utils
+from pyrogram.errors import FloodWait
+from pyrogram.session import Session
+
+import config
+from outbound import flood_wait_seconds
+
+LOG = logging.getLogger(__name__)
+
+PART_SIZE = 512 * 1024
+BIG_FILE_THRESHOLD = 10 * 1024 * 1024
+
+
+async def _invoke(target, query):
+    # pyrogram 2.x renamed send() to invoke() on both Client and Session
+    call = getattr(target, "invoke", None) or target.send
+    return await call(query)
+
+
+async def _open_sessions(client: Client, count: int):
+    dc_id = await client.storage.dc_id()
+    auth_key = await client.storage.auth_key()
+    test_mode = await client.storage.test_mode()
+    sessions = [Session(client, dc_id, auth_key, test_mode, is_media=True) for _ in range(count)]
+    await asyncio.gather(*(s.start() for s in sessions))
+    return sessions
+
+
+async def upload_file(client: Client, path: str, progress=None, progress_args=()):
+    """Upload `path` with UPLOAD_WORKERS concurrent part uploads.
+
+    Parts are spread over UPLOAD_CONNECTIONS media sessions and each part is
+    retried on its own, so one slow or failed part doesn't restart the file.
+    Returns the raw InputFile/InputFileBig to attach to a SendMedia call.
+    """
+    file_size = os.path.getsize(path)
+    if file_size == 0:
+        raise ValueError("File is empty")
+
+    total_parts = (file_size + PART_SIZE - 1) // PART_SIZE
+    is_big = file_size > BIG_FILE_THRESHOLD
+    file_id = client.rnd_id()
+
+    connections = max(1, min(config.UPLOAD_CONNECTIONS, config.UPLOAD_WORKERS))
+    workers = max(1, min(config.UPLOAD_WORKERS, total_parts))
+    sessions = await _open_sessions(client, connections)
+
+    queue = asyncio.Queue()
+    for part in range(total_parts):
+        queue.put_nowait(part)
+
+    uploaded = 0
+
+    async def worker(session: Session):
+        nonlocal uploaded
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    part = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+
+                f.seek(part * PART_SIZE)
+                chunk = f.read(PART_SIZE)
+                if is_big:
+                    query = raw.functions.upload.SaveBigFilePart(
+                        file_id=file_id, file_part=part, file_total_parts=total_parts, bytes=chunk
+                    )
+                else:
+                    query = raw.functions.upload.SaveFilePart(file_id=file_id, file_part=part, bytes=chunk)
+
+                # FloodWait is a pause, not a failure: only errors use up attempts
+                attempt = 0
+                while True:
+                    try:
+                        await _invoke(session, query)
+                        break
+                    except FloodWait as e:
+                        await asyncio.sleep(flood_wait_seconds(e))
+                    except Exception as e:
+                        attempt += 1
+                        if attempt >= config.UPLOAD_PART_RETRIES:
+                            raise RuntimeError(
+                                f"Upload part {part}/{total_parts} failed after {attempt} attempts: {e}"
+                            ) from e
+                        LOG.warning(f"[Upload] Part {part}/{total_parts} failed (attempt {attempt}): {e}")
+                        await asyncio.sleep(attempt)
+
+                uploaded += len(chunk)
+                if progress:
+                    await progress(uploaded, file_size, *progress_args)
+
+    tasks = [asyncio.create_task(worker(sessions[i % connections])) for i in range(workers)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # One failed part fails the upload: stop the other workers before their sessions go away
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.gather(*(s.stop() for s in sessions), return_exceptions=True)
+
+    name = os.path.basename(path)
+    if is_big:
+        return raw.types.InputFileBig(id=file_id, parts=total_parts, name=name)
+    return raw.types.InputFile(id=file_id, parts=total_parts, name=name, md5_checksum="")
+
+
+async def send_video(
+    client: Client,
+    chat_id: int,
+    video: str,
+    caption: str = "",
+    thumb: str = None,
+    duration: int = 0,
+    width: int = 0,
+    height: int = 0,
+    supports_streaming: bool = False,
+    reply_to_message_id: int = None,
+    progress=None,
+    progress_args=(),
+):
+    """Drop-in for Client.send_video that uploads the file with upload_file()."""
+    if config.UPLOAD_WORKERS <= 1:
+        return await client.send_video(
+            chat_id=chat_id,
+            video=video,
+            caption=caption,
+            thumb=thumb,
+            duration=duration,
+            width=width,
+            height=height,
+            supports_streaming=supports_streaming,
+            reply_to_message_id=reply_to_message_id,
+            progress=progress,
+            progress_args=progress_args,
+        )
+
+    start = time.time()
+    file = await upload_file(client, video, progress, progress_args)
+    thumb_file = await client.save_file(thumb) if thumb else None
+    LOG.info(
+        f"[Upload] {os.path.basename(video)}: {os.path.getsize(video) / (1024 * 1024):.2f} MB "
+        f"in {time.time() - start:.1f}s with {config.UPLOAD_WORKERS} workers"
+    )
+
+    media = raw.types.InputMediaUploadedDocument(
+        mime_type=mimetypes.guess_type(video)[0] or "video/mp4",
+        file=file,
+        thumb=thumb_file,
+        attributes=[
+            raw.types.DocumentAttributeVideo(
+                supports_streaming=supports_streaming or None,
+                duration=duration,
+                w=width,
+                h=height,
+            ),
+            raw.types.DocumentAttributeFilename(file_name=os.path.basename(video)),
+        ],
+    )
+
+    r = await _invoke(client, raw.functions.messages.SendMedia(
+        peer=await client.resolve_peer(chat_id),
+        media=media,
+        reply_to_msg_id=reply_to_message_id,
+        random_id=client.rnd_id(),
+        **await utils.parse_text_entities(client, caption, None, None)
+    ))
+
+    for update in r.updates:
+        if isinstance(update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage)):
+            return await types.Message._parse(
+                client, update.message,
+                {u.id: u for u in r.users},
+                {c.id: c for c in r.chats},
+            )
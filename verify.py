@@ -1,18 +1,28 @@
 import time
+import asyncio
+import logging
 import secrets
 import httpx
+from collections import deque
 from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError
 from pyrogram import Client
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from outbound import for_client
 
 from config import (
     MONGO_URI,
     SHORTLINK_URL,
     SHORTLINK_API,
     VERIFICATION_EXPIRY_SECONDS,
-    WORKING_GROUP
+    WORKING_GROUP,
+    VERIFY_POOL_SIZE,
+    VERIFY_POOL_MAX_AGE,
+    VERIFY_POOL_REFILL_CONCURRENCY,
 )
 
+LOG = logging.getLogger(__name__)
+
 # -----------------------
 # 🔌 MongoDB Setup
 # -----------------------
@@ -30,54 +40,144 @@ def is_user_verified(user_id: int) -> bool:
     return doc.get("verified", False) and doc.get("expires_at", 0) > int(time.time())
 
 # -----------------------
-# ✅ Send verification message with shortlink button
+# 🔗 Pre-shortened verification links
 # -----------------------
-async def send_verification_message(bot: Client, message):
-    user_id = message.from_user.id
-    username = message.from_user.username or message.from_user.first_name
-    now = int(time.time())
+# (token, shortlink, created_at), oldest first; filled in the background so
+# /verify never waits on get_me() or the shortlink API
+link_pool = deque()
+_pool_wanted = asyncio.Event()
+_bot_username = None
+_http = None
+
+
+def _client() -> httpx.AsyncClient:
+    # One client for refills and inline fallbacks, so connections to the API are reused
+    global _http
+    if _http is None:
+        _http = httpx.AsyncClient()
+    return _http
+
+
+async def _verify_url(bot: Client, token: str) -> str:
+    global _bot_username
+    if _bot_username is None:
+        _bot_username = (await bot.get_me()).username
+    return f"https://t.me/{_bot_username}?start=verify_{token}"
 
-    # Check existing verified and unexpired
-    existing = tokens.find_one({"_id": user_id})
-    if existing:
-        expires_at = existing.get("expires_at", 0)
-        if existing.get("verified") and now < expires_at:
-            remaining = expires_at - now
-            return await message.reply(
-                f"✅ You are already verified.\n"
-                f"⏳ Remaining time: {remaining // 3600}h {(remaining % 3600) // 60}m",
-                quote=True
-            )
-
-    # Generate new token and save
+
+async def _shorten(client: httpx.AsyncClient, verify_url: str) -> str:
+    api_url = f"{SHORTLINK_URL}/api?api={SHORTLINK_API}&url={verify_url}"
+    resp = await client.get(api_url, timeout=10)
+    data = resp.json()
+    if data.get("status") != "success":
+        raise ValueError(data.get("message") or "shortlink API refused the request")
+    return data.get("shortenedUrl")
+
+
+async def _add_pool_link(bot: Client):
     token = secrets.token_urlsafe(12)
-    tokens.update_one(
-        {"_id": user_id},
-        {"$set": {
-            "token": token,
-            "username": username,
-            "verified": False,
-            "expires_at": now + VERIFICATION_EXPIRY_SECONDS
-        }},
-        upsert=True
+    shortlink = await _shorten(_client(), await _verify_url(bot, token))
+    link_pool.append((token, shortlink, time.time()))
+
+
+async def fill_verification_pool(bot: Client):
+    """Keep VERIFY_POOL_SIZE fresh links ready; a slow shortlink API only delays refills.
+
+    Up to VERIFY_POOL_REFILL_CONCURRENCY links are shortened at once, so a
+    burst of /verify drains the pool no faster than it is refilled.
+    """
+    failures = 0
+    while True:
+        while link_pool and link_pool[0][2] < time.time() - VERIFY_POOL_MAX_AGE:
+            link_pool.popleft()
+        if len(link_pool) >= VERIFY_POOL_SIZE:
+            _pool_wanted.clear()
+            try:
+                # Woken when a link is taken, otherwise re-check ages every minute
+                await asyncio.wait_for(_pool_wanted.wait(), 60)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        batch = min(VERIFY_POOL_SIZE - len(link_pool), max(1, VERIFY_POOL_REFILL_CONCURRENCY))
+        results = await asyncio.gather(*(_add_pool_link(bot) for _ in range(batch)), return_exceptions=True)
+        errors = [r for r in results if isinstance(r, Exception)]
+        if len(errors) < len(results):
+            failures = 0
+            continue
+        failures += 1
+        LOG.warning(f"[Verify] Shortlink refill failed ({failures}x): {errors[0]}")
+        await asyncio.sleep(min(300, 5 * 2 ** min(failures, 6)))
+
+
+def bind_verification_token(user_id: int, username: str):
+    """Give the user a pooled (token, shortlink) with one atomic write.
+
+    Returns (None, None) if the user is already verified. The shortlink is
+    None when the pool was empty; the caller then shortens it inline.
+    """
+    now = int(time.time())
+    entry = None
+    while link_pool and entry is None:
+        entry = link_pool.popleft()
+        if entry[2] < time.time() - VERIFY_POOL_MAX_AGE:
+            entry = None
+    _pool_wanted.set()
+    token, shortlink = entry[:2] if entry else (secrets.token_urlsafe(12), None)
+
+    try:
+        # Matches unless the user holds a valid verification; the upsert then
+        # collides on _id, so "already verified" costs no extra read
+        tokens.update_one(
+            {"_id": user_id, "$or": [{"verified": {"$ne": True}}, {"expires_at": {"$lte": now}}]},
+            {"$set": {
+                "token": token,
+                "username": username,
+                "verified": False,
+                "expires_at": now + VERIFICATION_EXPIRY_SECONDS
+            }},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        if entry:
+            link_pool.appendleft(entry)
+        return None, None
+    return token, shortlink
+
+
+async def verification_link(bot: Client, user_id: int, username: str):
+    """Shortlink for the user's /verify, or None if they are already verified."""
+    token, shortlink = bind_verification_token(user_id, username)
+    if token is None or shortlink:
+        return shortlink
+
+    # Pool empty (refill lagging or API down): do it inline, falling back to the plain link
+    verify_url = await _verify_url(bot, token)
+    try:
+        return await _shorten(_client(), verify_url)
+    except Exception:
+        return verify_url
+
+
+async def already_verified_reply(message):
+    doc = tokens.find_one({"_id": message.from_user.id}) or {}
+    remaining = max(0, doc.get("expires_at", 0) - int(time.time()))
+    return await message.reply(
+        f"✅ You are already verified.\n"
+        f"⏳ Remaining time: {remaining // 3600}h {(remaining % 3600) // 60}m",
+        quote=True
     )
 
-    # Prepare verification URL and get shortlink via API
-    bot_username = (await bot.get_me()).username
-    verify_url = f"https://t.me/{bot_username}?start=verify_{token}"
 
-    api_url = f"{SHORTLINK_URL}/api?api={SHORTLINK_API}&url={verify_url}"
+# -----------------------
+# ✅ Send verification message with shortlink button
+# -----------------------
+async def send_verification_message(bot: Client, message):
+    user_id = message.from_user.id
+    username = message.from_user.username or message.from_user.first_name
 
-    async with httpx.AsyncClient() as client:
-        try:
-            resp = await client.get(api_url, timeout=10)
-            data = resp.json()
-            if data.get("status") == "success":
-                shortlink = data.get("shortenedUrl")
-            else:
-                shortlink = verify_url
-        except Exception:
-            shortlink = verify_url
+    shortlink = await verification_link(bot, user_id, username)
+    if shortlink is None:
+        return await already_verified_reply(message)
 
     markup = InlineKeyboardMarkup([
         [InlineKeyboardButton("🔗 Verify Here", url=shortlink)]
@@ -109,14 +209,11 @@ async def complete_verification(bot: Client, user_id: int, token: str) -> bool:
         }}
     )
 
-    # Notify group (optional)
-    try:
-        username = doc.get("username", "User")
-        await bot.send_message(
-            WORKING_GROUP,
-            f"✅ **{username}** has successfully verified and can now access recording features."
-        )
-    except Exception:
-        pass
+    # Notify group (batched into a digest by the outbound scheduler)
+    username = doc.get("username", "User")
+    for_client(bot).notify(
+        WORKING_GROUP,
+        f"✅ **{username}** has successfully verified and can now access recording features."
+    )
 
     return True
@@ -4,6 +4,7 @@ import asyncio
 from fastapi import FastAPI, Request
 from pymongo import MongoClient
 from pyrogram import Client
+from outbound import for_client
 
 from config import MONGO_URI, WORKING_GROUP, VERIFICATION_EXPIRY_SECONDS, API_ID, API_HASH, BOT_TOKEN
 
@@ -55,12 +56,9 @@ async def verify_callback(req: Request):
         }}
     )
 
-    try:
-        await rvbot.send_message(
-            WORKING_GROUP,
-            f"✅ **{username}** has successfully verified and can now access recording features!"
-        )
-    except Exception as e:
-        logging.error(f"Failed to send verification message: {e}")
+    for_client(rvbot).notify(
+        WORKING_GROUP,
+        f"✅ **{username}** has successfully verified and can now access recording features!"
+    )
 
     return {"status": "success"}
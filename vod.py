@@ -0,0 +1,74 @@
+import os
+import shutil
+import asyncio
+import logging
+
+import httpx
+
+import config
+
+LOG = logging.getLogger(__name__)
+
+
+async def _fetch_segment(client: httpx.AsyncClient, uri: str, path: str):
+    for attempt in range(1, config.VOD_SEGMENT_RETRIES + 1):
+        try:
+            async with client.stream("GET", uri) as resp:
+                resp.raise_for_status()
+                with open(path, "wb") as f:
+                    async for chunk in resp.aiter_bytes(256 * 1024):
+                        f.write(chunk)
+            return os.path.getsize(path)
+        except Exception as e:
+            if attempt == config.VOD_SEGMENT_RETRIES:
+                raise
+            LOG.warning(f"[VOD] Segment fetch failed (attempt {attempt}): {uri}: {e}")
+            await asyncio.sleep(attempt)
+
+
+def _concat(parts, target: str):
+    with open(target, "wb") as out:
+        for part in parts:
+            with open(part, "rb") as f:
+                shutil.copyfileobj(f, out, 1024 * 1024)
+            os.remove(part)
+
+
+async def download(playlist, segments, work_dir: str, progress=None) -> str:
+    """Fetch `segments` of a finished playlist concurrently and join them in order.
+
+    Returns the path of the joined source (.ts, or .mp4 for fMP4 playlists
+    whose init section is prepended), ready for a copy-only remux.
+    """
+    parts_dir = os.path.join(work_dir, "segments")
+    os.makedirs(parts_dir, exist_ok=True)
+
+    uris = ([playlist.init_uri] if playlist.init_uri else []) + [s.uri for s in segments]
+    paths = [os.path.join(parts_dir, f"{i:06}.part") for i in range(len(uris))]
+
+    limits = httpx.Limits(max_connections=config.VOD_CONNECTIONS, max_keepalive_connections=config.VOD_CONNECTIONS)
+    semaphore = asyncio.Semaphore(config.VOD_CONNECTIONS)
+    done = 0
+    fetched = 0
+
+    async with httpx.AsyncClient(limits=limits, timeout=30, follow_redirects=True) as client:
+        async def fetch(uri, path):
+            nonlocal done, fetched
+            async with semaphore:
+                fetched += await _fetch_segment(client, uri, path)
+            done += 1
+            if progress:
+                await progress(done, len(uris), fetched)
+
+        tasks = [asyncio.create_task(fetch(u, p)) for u, p in zip(uris, paths)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    target = os.path.join(work_dir, "source.mp4" if playlist.init_uri else "source.ts")
+    await asyncio.to_thread(_concat, paths, target)
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    return target